@@ -87,6 +87,12 @@ def parse_args(commands):
         nargs="*",
         help="Specify additional file(s) to package when using the 'pack' command."
     )
+    parser.add_argument(
+        "--tag",
+        type=str,
+        nargs="*",
+        help="Specify the wheel or ABI tag(s) to build when using the 'matrix' command."
+    )
     cmd_help_1 = ", ".join(f"'{k}'" for k, (f, doc) in commands.items() if doc)
     cmd_help_2 = "\n".join(f"{k}: {doc}" for k, (f, doc) in commands.items() if doc)
     parser.add_argument(
@@ -116,8 +122,10 @@ COMMANDS = {
     "sdist": (BuildState.build_sdist, "Build an sdist."),
     "wheel": (BuildState.build_wheel, "Build a wheel."),
     "pack": (BuildState.pack, "Perform the second step of a two-step build."),
+    "matrix": (BuildState.build_matrix, "Build a wheel for each tag passed with --tag."),
     "distinfo": (BuildState.prepare_wheel_distinfo, "Build just the wheel metadata"),
     "clean": (BuildState.clean, "Clean any builds."),
+    "shutdown": (BuildState.shutdown, "Shut down MSBuild nodes kept running by PYMSBUILD_NODE_REUSE."),
     "build_in_place": (BuildState.build_in_place, None),
 }
 
@@ -143,6 +151,7 @@ bs.build_dir = root_dir / "bin"
 bs.temp_dir = root_dir / "temp"
 bs.layout_dir = ns.layout_dir
 bs.layout_extra_files = ns.add
+bs.matrix = ns.tag
 bs.verbose = ns.verbose
 bs.quiet = ns.quiet
 bs.force = ns.force
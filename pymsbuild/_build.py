@@ -8,32 +8,159 @@ import sysconfig
 
 from pathlib import PurePath, Path
 
+from . import _cache
 from . import _generate
 from . import _tags
 
 if sys.platform == "win32":
     _WINDOWS = True
-    from ._locate_vs import locate_msbuild
+    from ._locate_vs import locate_msbuild, get_node_reuse_options
 else:
     _WINDOWS = False
-    from ._locate_dotnet import locate_msbuild
+    from ._locate_dotnet import locate_msbuild, get_node_reuse_options
 
 
 # Needed to avoid printing an unhelpful message every time we invoke dotnet
 os.environ["DOTNET_NOLOGO"] = "1"
 
 
-def _add_and_record(zipfile, path, relpath, hashalg="sha256"):
+# Files whose first block compresses worse than this ratio are stored
+_AUTO_COMPRESSION_SAMPLE = 65536
+_AUTO_COMPRESSION_RATIO = 0.9
+
+# Compressed files larger than this are spooled to disk by pack threads
+_PACK_SPOOL_SIZE = 4 * 1024 * 1024
+
+# ZipInfo.compress_level is public from 3.13. Earlier versions can only set
+# a per-file level through ZipFile.writestr, which reads the whole file.
+_ZIP_COMPRESS_LEVEL = sys.version_info >= (3, 13)
+
+# Parallel packing and reusing members from an earlier wheel write already
+# compressed data, which ZipFile has no public API for. _write_raw uses the
+# same internals as ZipFile.open(..., "w"), which are known to be unchanged
+# up to this version. Otherwise, files are compressed serially.
+_ZIP_RAW_WRITES = sys.version_info < (3, 15)
+
+# Digests are only kept in the layout manifest for files last modified at
+# least this long before they were hashed. Otherwise, an edit within the
+# same timestamp tick could leave the same size and mtime.
+_MANIFEST_RACY_NS = 2 * 1000 * 1000 * 1000
+
+
+def _parse_compression(policy):
+    if policy is None or policy == "":
+        return None
+    p = str(policy).strip().casefold()
+    if p in {"stored", "store", "none"}:
+        return "stored"
+    if p in {"deflate", "deflated"}:
+        return "deflate"
+    if p == "auto":
+        return "auto"
+    try:
+        level = int(p)
+    except ValueError:
+        level = -1
+    if 0 <= level <= 9:
+        return level
+    raise ValueError(f"Unsupported compression '{policy}'. " +
+                     "Use 'stored', 'deflate', 'auto' or a level from 0 to 9")
+
+
+def _parse_compression_policy(policy):
+    if not policy:
+        return []
+    if isinstance(policy, dict):
+        items = policy.items()
+    else:
+        items = []
+        for i in str(policy).split(";"):
+            k, _, v = i.rpartition("=")
+            if v.strip():
+                items.append((k.strip() or "*", v))
+    result = []
+    for k, v in items:
+        if k.startswith("."):
+            k = "*" + k
+        result.append((k, _parse_compression(v)))
+    return result
+
+
+def _get_compression(policy, path):
+    import zipfile, zlib
+    if policy == "stored":
+        return zipfile.ZIP_STORED, None
+    if policy == "auto":
+        with open(path, "rb") as f:
+            b = f.read(_AUTO_COMPRESSION_SAMPLE)
+        if len(zlib.compress(b, 1)) > len(b) * _AUTO_COMPRESSION_RATIO:
+            return zipfile.ZIP_STORED, None
+        return zipfile.ZIP_DEFLATED, None
+    if isinstance(policy, int):
+        return zipfile.ZIP_DEFLATED, policy
+    return zipfile.ZIP_DEFLATED, None
+
+
+def _is_true(value):
+    return str(value or "").lower() not in {"", "0", "no", "false"}
+
+
+# The earliest time that can be represented in a ZIP file
+_ZIP_EPOCH = 315532800
+
+
+def _deterministic_attrs(path, epoch):
+    # Returns (mtime, mode) with the mtime clamped to epoch and the mode
+    # reduced to whether the file is executable or not.
+    st = os.stat(path)
+    mtime = max(_ZIP_EPOCH, min(int(st.st_mtime), epoch))
+    return mtime, (0o755 if st.st_mode & 0o111 else 0o644)
+
+
+def _zipinfo(relpath, attrs=None):
+    import stat, time, zipfile
+    if not attrs:
+        zinfo = zipfile.ZipInfo(str(relpath))
+        zinfo.external_attr = 0o600 << 16
+        return zinfo
+    mtime, mode = attrs
+    zinfo = zipfile.ZipInfo(str(relpath), time.gmtime(mtime)[:6])
+    # Always claim to be from a POSIX system so that the mode is respected
+    zinfo.create_system = 3
+    zinfo.external_attr = (stat.S_IFREG | mode) << 16
+    return zinfo
+
+
+def _add_and_record(zipfile, path, relpath, hashalg="sha256", compression=None, digest=None, epoch=None):
     import base64, hashlib
-    hasher = getattr(hashlib, hashalg)() if hashalg else None
+    hasher = getattr(hashlib, hashalg)() if hashalg and not digest else None
     l = 0
-    with open(path, "rb") as f:
-        with zipfile.open(str(relpath), "w") as zf:
-            for b in iter(lambda: f.read(8192), b""):
-                if hasher:
-                    hasher.update(b)
-                l += len(b)
-                zf.write(b)
+    zinfo = _zipinfo(relpath, _deterministic_attrs(path, epoch) if epoch is not None else None)
+    # As in ZipFile.write, the size decides whether a zip64 header is needed
+    zinfo.file_size = os.stat(path).st_size
+    if compression is not None:
+        zinfo.compress_type, level = _get_compression(compression, path)
+    else:
+        zinfo.compress_type, level = zipfile.compression, zipfile.compresslevel
+    if level is not None and not _ZIP_COMPRESS_LEVEL:
+        with open(path, "rb") as f:
+            data = f.read()
+        if hasher:
+            hasher.update(data)
+        l = len(data)
+        zipfile.writestr(zinfo, data, compresslevel=level)
+    else:
+        if level is not None:
+            zinfo.compress_level = level
+        with open(path, "rb") as f:
+            with zipfile.open(zinfo, "w") as zf:
+                for b in iter(lambda: f.read(8192), b""):
+                    if hasher:
+                        hasher.update(b)
+                    l += len(b)
+                    zf.write(b)
+    if digest:
+        return "{},{},{}".format(relpath, digest, l)
     if hashalg:
         return "{},{}={},{}".format(
             relpath,
@@ -44,7 +171,234 @@ def _add_and_record(zipfile, path, relpath, hashalg="sha256"):
     return "{},,".format(relpath)
 
 
-def _relative_to_layout(files, root):
+def _compress_and_record(path, relpath, hashalg="sha256", compression=None, digest=None, epoch=None):
+    # Worker half of _add_and_record. Produces the same deflate stream as
+    # ZipFile.open(..., "w") would, but into a spooled temporary file so
+    # it can be written later by _write_compressed.
+    import base64, hashlib, tempfile, zipfile, zlib
+    hasher = getattr(hashlib, hashalg)() if hashalg and not digest else None
+    compress_type, level = _get_compression(compression, path)
+    compressor = None
+    if compress_type != zipfile.ZIP_STORED:
+        if level is None:
+            level = zlib.Z_DEFAULT_COMPRESSION
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    crc = 0
+    l = 0
+    data = tempfile.SpooledTemporaryFile(_PACK_SPOOL_SIZE)
+    try:
+        with open(path, "rb") as f:
+            for b in iter(lambda: f.read(65536), b""):
+                if hasher:
+                    hasher.update(b)
+                crc = zlib.crc32(b, crc)
+                l += len(b)
+                data.write(compressor.compress(b) if compressor else b)
+        if compressor:
+            data.write(compressor.flush())
+    except:
+        data.close()
+        raise
+    if digest:
+        record = "{},{},{}".format(relpath, digest, l)
+    elif hashalg:
+        record = "{},{}={},{}".format(
+            relpath,
+            hashalg,
+            base64.urlsafe_b64encode(hasher.digest()).rstrip(b"=").decode(),
+            l,
+        )
+    else:
+        record = "{},,".format(relpath)
+    attrs = _deterministic_attrs(path, epoch) if epoch is not None else None
+    return str(relpath), attrs, compress_type, crc, l, data, record
+
+
+def _write_raw(zipfile, zinfo, read):
+    # Mirrors what ZipFile.open(..., "w") does for seekable files, except
+    # that the header is only written once because the sizes are known.
+    # read(n) returns up to n bytes of the already compressed data.
+    # Callers must check _ZIP_RAW_WRITES first.
+    import zipfile as _zipfile
+    # Use the same rule as ZipFile.open, so headers match a serial pack
+    zip64 = zipfile._allowZip64 and zinfo.file_size * 1.05 > _zipfile.ZIP64_LIMIT
+    if not zip64 and zinfo.compress_size > _zipfile.ZIP64_LIMIT:
+        raise RuntimeError(f"Compressed size of {zinfo.filename} is too large")
+    with zipfile._lock:
+        zipfile._writecheck(zinfo)
+        zipfile._didModify = True
+        zipfile.fp.seek(zipfile.start_dir)
+        zinfo.header_offset = zipfile.fp.tell()
+        zipfile.fp.write(zinfo.FileHeader(zip64))
+        remaining = zinfo.compress_size
+        while remaining > 0:
+            b = read(min(remaining, 1024 * 1024))
+            if not b:
+                raise EOFError(f"Unexpected end of file writing {zinfo.filename}")
+            zipfile.fp.write(b)
+            remaining -= len(b)
+        zipfile.start_dir = zipfile.fp.tell()
+        zipfile.filelist.append(zinfo)
+        zipfile.NameToInfo[zinfo.filename] = zinfo
+
+
+def _write_compressed(zipfile, entry):
+    name, attrs, compress_type, crc, file_size, data, record = entry
+    with data:
+        zinfo = _zipinfo(name, attrs)
+        zinfo.compress_type = compress_type
+        zinfo.CRC = crc
+        zinfo.file_size = file_size
+        zinfo.compress_size = data.tell()
+        data.seek(0)
+        _write_raw(zipfile, zinfo, data.read)
+    return record
+
+
+def _copy_compressed(zipfile, source, info, record, attrs=None):
+    # Copies a member from another archive without decompressing it
+    import struct, zipfile as _zipfile
+    source.fp.seek(info.header_offset)
+    header = source.fp.read(_zipfile.sizeFileHeader)
+    name_len, extra_len = struct.unpack("<HH", header[26:30])
+    source.fp.seek(info.header_offset + _zipfile.sizeFileHeader + name_len + extra_len)
+    if attrs:
+        zinfo = _zipinfo(info.filename, attrs)
+    else:
+        zinfo = _zipfile.ZipInfo(info.filename, info.date_time)
+        zinfo.external_attr = info.external_attr
+    zinfo.compress_type = info.compress_type
+    zinfo.CRC = info.CRC
+    zinfo.file_size = info.file_size
+    zinfo.compress_size = info.compress_size
+    _write_raw(zipfile, zinfo, source.fp.read)
+    return record
+
+
+def _add_and_record_parallel(zipfile, files, threads, log=None, epoch=None):
+    from collections import deque
+    from concurrent.futures import ThreadPoolExecutor
+    # Bound the number of compressed files waiting to be written at once
+    pending = deque()
+    with ThreadPoolExecutor(threads) as pool:
+        for n, rn, compression, digest, reuse in files:
+            if reuse:
+                if log:
+                    log("-", rn, "(unchanged)")
+                pending.append(reuse)
+            else:
+                if log:
+                    log("-", rn)
+                future = pool.submit(
+                    _compress_and_record, n, rn, compression=compression, digest=digest, epoch=epoch
+                )
+                pending.append(lambda future=future: _write_compressed(zipfile, future.result()))
+            while len(pending) > threads * 2:
+                yield pending.popleft()()
+        while pending:
+            yield pending.popleft()()
+
+
+def _hash_file(path, hashalg="sha256"):
+    import base64, hashlib
+    hasher = getattr(hashlib, hashalg)()
+    with open(path, "rb") as f:
+        for b in iter(lambda: f.read(65536), b""):
+            hasher.update(b)
+    return "{}={}".format(
+        hashalg,
+        base64.urlsafe_b64encode(hasher.digest()).rstrip(b"=").decode(),
+    )
+
+
+def _read_wheel_record(wheel, distinfo_name):
+    # Returns {relpath: (digest, size, ZipInfo)} for members listed in RECORD
+    import zipfile as _zipfile
+    try:
+        members = {i.filename: i for i in wheel.infolist()}
+        record = wheel.read(f"{distinfo_name}/RECORD").decode("utf-8")
+    except (KeyError, _zipfile.BadZipFile):
+        return {}
+    result = {}
+    for i in record.splitlines():
+        try:
+            name, digest, size = i.rsplit(",", 2)
+        except ValueError:
+            continue
+        info = members.get(name.replace(os.sep, "/"))
+        if info and digest and size.isdigit():
+            result[name] = digest, int(size), info
+    return result
+
+
+def _copy_and_hash(src, dest, hashalg="sha256"):
+    import base64, hashlib
+    hasher = getattr(hashlib, hashalg)()
+    with open(src, "rb") as f1, open(dest, "wb") as f2:
+        for b in iter(lambda: f1.read(8192), b""):
+            hasher.update(b)
+            f2.write(b)
+    # Keep the mtime, so that the manifest entry may outlive this layout
+    shutil.copystat(src, dest)
+    return "{}={}".format(
+        hashalg,
+        base64.urlsafe_b64encode(hasher.digest()).rstrip(b"=").decode(),
+    )
+
+
+def _manifest_entry(path, digest, start):
+    return _manifest_row(os.stat(path), digest, start)
+
+
+def _manifest_row(st, digest, start):
+    # start is when hashing began, from time.time_ns()
+    if st.st_mtime_ns >= start - _MANIFEST_RACY_NS:
+        digest = ""
+    return st.st_size, st.st_mtime_ns, digest
+
+
+def _read_manifest(file, root):
+    # Returns None if the manifest is missing or belongs to another layout
+    try:
+        f = open(file, "r", encoding="utf-8-sig")
+    except OSError:
+        return None
+    manifest = {}
+    with f:
+        header = f.readline().rstrip("\r\n")
+        if not header.startswith("# ") or not _same_path(header[2:], root):
+            return None
+        for i in f:
+            bits = i.rstrip("\r\n").rsplit("\t", 3)
+            if len(bits) == 4:
+                manifest[bits[0]] = int(bits[1]), int(bits[2]), bits[3]
+    return manifest
+
+
+def _same_path(p1, p2):
+    return os.path.normcase(os.path.abspath(p1)) == os.path.normcase(os.path.abspath(p2))
+
+
+def _write_manifest(file, root, manifest):
+    with open(file, "w", encoding="utf-8") as f:
+        print("#", root, file=f)
+        for rn, (size, mtime, digest) in manifest.items():
+            print(rn, size, mtime, digest, sep="\t", file=f)
+
+
+def _check_manifest(manifest, relpath, st):
+    # Returns the recorded digest only if the file is unchanged since layout
+    try:
+        size, mtime, digest = manifest[str(relpath)]
+    except (KeyError, TypeError):
+        return None
+    if st.st_size != size or st.st_mtime_ns != mtime:
+        return None
+    return digest or None
+
+
+def _stat_relative_to_layout(files, root, log=None):
+    import stat
     if not files:
         files = root.rglob("**/*")
     for n in files:
@@ -52,13 +406,164 @@ def _relative_to_layout(files, root):
         try:
             rn = n.relative_to(root)
         except ValueError:
-            self.write("Not including", n, "from outside of layout directory")
+            if log:
+                log("Not including", n, "from outside of layout directory")
+            continue
+        try:
+            st = n.stat()
+        except OSError:
             continue
-        if n.is_file():
-            yield n, rn
+        if stat.S_ISREG(st.st_mode):
+            yield n, rn, st
+
+
+def _relative_to_layout(files, root, log=None):
+    for n, rn, st in _stat_relative_to_layout(files, root, log):
+        yield n, rn
+
+
+def _parse_gzip_level(level):
+    if level is None or level == "":
+        return 9
+    try:
+        v = int(level)
+    except ValueError:
+        v = -1
+    if 0 <= v <= 9:
+        return v
+    raise ValueError(f"Unsupported sdist compression '{level}'. Use a level from 0 to 9")
+
+
+def _tarinfo(tar, relpath, st, names, epoch=None):
+    # Equivalent to TarFile.gettarinfo for regular files, but reuses the
+    # stat result rather than querying the file again.
+    import tarfile
+    info = tar.tarinfo(PurePath(relpath).as_posix())
+    info.type = tarfile.REGTYPE
+    info.size = st.st_size
+    if epoch is not None:
+        info.mtime = max(0, min(int(st.st_mtime), epoch))
+        info.mode = 0o755 if st.st_mode & 0o111 else 0o644
+        return info
+    info.mode = st.st_mode
+    info.uid = st.st_uid
+    info.gid = st.st_gid
+    info.mtime = st.st_mtime
+    try:
+        info.uname, info.gname = names[st.st_uid, st.st_gid]
+    except KeyError:
+        try:
+            import grp, pwd
+            info.uname = pwd.getpwuid(st.st_uid)[0]
+            info.gname = grp.getgrgid(st.st_gid)[0]
+        except (ImportError, KeyError):
+            pass
+        names[st.st_uid, st.st_gid] = info.uname, info.gname
+    return info
+
+
+def _deflate_block(data, level, zdict, last):
+    import zlib
+    if zdict:
+        c = zlib.compressobj(level, zlib.DEFLATED, -15, zlib.DEF_MEM_LEVEL, zlib.Z_DEFAULT_STRATEGY, zdict)
+    else:
+        c = zlib.compressobj(level, zlib.DEFLATED, -15)
+    return c.compress(data) + c.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+
+class _ParallelGzipFile:
+    # Compresses fixed size blocks on a thread pool and writes them in
+    # order as a single gzip member, in the same way as pigz. Each block
+    # is primed with the end of the previous one, so the compression ratio
+    # is close to that of a single stream.
+    BLOCK_SIZE = 1024 * 1024
+    WINDOW_SIZE = 32 * 1024
+
+    def __init__(self, filename, fileobj, level, threads, mtime=None):
+        import struct, time
+        from collections import deque
+        from concurrent.futures import ThreadPoolExecutor
+        self.fileobj = fileobj
+        self.level = level
+        self.threads = threads
+        self._pool = ThreadPoolExecutor(threads)
+        self._pending = deque()
+        self._buffer = bytearray()
+        self._zdict = None
+        self._crc = 0
+        self._size = 0
+        fname = os.path.basename(filename)
+        if fname.endswith(".gz"):
+            fname = fname[:-3]
+        fname = fname.encode("latin-1", "replace")
+        xfl = b"\002" if level == 9 else b"\004" if level == 1 else b"\000"
+        if mtime is None:
+            mtime = time.time()
+        self.fileobj.write(b"\037\213\010" + (b"\010" if fname else b"\000"))
+        self.fileobj.write(struct.pack("<L", int(mtime)) + xfl + b"\377")
+        if fname:
+            self.fileobj.write(fname + b"\000")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if exc_type:
+            # Nothing more is written, as the caller discards the output
+            for f in self._pending:
+                f.cancel()
+            self._pending.clear()
+            self._buffer.clear()
+            self._pool.shutdown(wait=True)
+        else:
+            self.close()
+
+    def tell(self):
+        return self._size
+
+    def write(self, data):
+        import zlib
+        self._crc = zlib.crc32(data, self._crc)
+        self._size += len(data)
+        self._buffer += data
+        while len(self._buffer) >= self.BLOCK_SIZE:
+            self._submit(bytes(self._buffer[:self.BLOCK_SIZE]), False)
+            del self._buffer[:self.BLOCK_SIZE]
+        return len(data)
+
+    def _submit(self, block, last):
+        self._pending.append(self._pool.submit(_deflate_block, block, self.level, self._zdict, last))
+        self._zdict = block[-self.WINDOW_SIZE:]
+        while len(self._pending) > self.threads * 2:
+            self.fileobj.write(self._pending.popleft().result())
+
+    def close(self):
+        import struct
+        self._submit(bytes(self._buffer), True)
+        self._buffer.clear()
+        while self._pending:
+            self.fileobj.write(self._pending.popleft().result())
+        self._pool.shutdown()
+        self.fileobj.write(struct.pack("<LL", self._crc, self._size & 0xFFFFFFFF))
+
+
+def _parse_matrix(matrix):
+    if not matrix:
+        return []
+    if isinstance(matrix, str):
+        matrix = re.split(r"[;,\s]+", matrix)
+    return [t.strip() for t in matrix if t and t.strip()]
+
+
+def _escape_property(value):
+    # Commas and semicolons would otherwise split the /p: option
+    if value is None:
+        return None
+    return value.replace("%", "%25").replace(",", "%2C").replace(";", "%3B")
 
 
 def _quote(s, start='"', end='"'):
+    s = s.replace('"', '\\"')
     if end and s.endswith("\\"):
         end = "\\" + end
     return start + s + end
@@ -110,8 +615,29 @@ class BuildState:
         self.distinfo_name = None
         self.python_cflags = None
         self.python_ldflags = None
+        self.python_embed_ldflags = None
         self.python_includes = None
         self.python_libs = None
+        self.pack_threads = None
+        self.sdist_compression = None
+        self.wheel_compression = None
+        self.incremental_pack = None
+        self.deterministic = None
+        self.source_date_epoch = None
+        self.manifest_file = None
+        self._manifest = None
+        self.build_cache_dir = None
+        self.node_reuse = None
+        self.matrix = None
+        self.matrix_threads = None
+        # Set by build_matrix to share work between the builds for each tag
+        self._dllpack_shared_dir = None
+        self._reference_manifest = None
+        self._reference_wheel = None
+        self.parallel_compile = None
+        self.compile_cache = None
+        self.compile_cache_size = None
+        self.pgo_training = None
 
     def finalize_metadata(self, getenv=os.getenv, sdist=False, in_place=False):
         if self._finalized:
@@ -131,6 +657,9 @@ class BuildState:
         self._set_best("state_file", None, "PYMSBUILD_STATE_FILE", (self.layout_dir / "__state.txt"), getenv)
         if self.state_file:
             self.state_file = Path(self.state_file)
+        self._set_best("manifest_file", None, "PYMSBUILD_MANIFEST_FILE", (self.temp_dir / "layout_manifest.txt"), getenv)
+        if self.manifest_file:
+            self.manifest_file = Path(self.manifest_file)
 
         type(self).current = self
 
@@ -145,6 +674,9 @@ class BuildState:
             if self.pkginfo.is_file():
                 self.log("Using", self.pkginfo)
                 self.metadata = _generate.readback_distinfo(self.pkginfo)
+                options = self.pkginfo.with_name(_generate.SDIST_OPTIONS_FILE)
+                if options.is_file():
+                    self.metadata.update(_generate.readback_distinfo(options))
                 try:
                     self.config.METADATA.update(self.metadata)
                 except AttributeError:
@@ -162,17 +694,26 @@ class BuildState:
         if self.metadata is None:
             raise RuntimeError("failed to locate METADATA")
 
-        self._set_best("msbuild_exe", None, "MSBUILD", None, getenv)
-        if self.msbuild_exe is None:
-            self.msbuild_exe = locate_msbuild()
-        if isinstance(self.msbuild_exe, str):
-            if Path(self.msbuild_exe).is_file():
-                self.msbuild_exe = [self.msbuild_exe]
-            else:
-                import shlex
-                self.msbuild_exe = shlex.split(self.msbuild_exe)
+        self._locate_msbuild(getenv)
+        self._set_best("node_reuse", None, "PYMSBUILD_NODE_REUSE", None, getenv)
+        self._set_best("matrix", None, "PYMSBUILD_MATRIX", None, getenv)
+        self._set_best("matrix_threads", None, "PYMSBUILD_MATRIX_THREADS", None, getenv)
 
         self._set_best("build_number", None, "BUILD_BUILDNUMBER", None, getenv)
+        self._set_best("build_cache_dir", None, "PYMSBUILD_BUILD_CACHE_DIR", None, getenv)
+        if self.build_cache_dir:
+            self.build_cache_dir = self.source_dir / self.build_cache_dir
+        self._set_best("parallel_compile", None, "PYMSBUILD_PARALLEL_COMPILE", None, getenv)
+        self._set_best("compile_cache", None, "PYMSBUILD_COMPILE_CACHE", None, getenv)
+        self._set_best("compile_cache_size", None, "PYMSBUILD_COMPILE_CACHE_SIZE", None, getenv)
+        if self.compile_cache:
+            self.compile_cache = self.source_dir / self.compile_cache
+        self._set_best("pack_threads", None, "PYMSBUILD_PACK_THREADS", None, getenv)
+        self._set_best("sdist_compression", None, "PYMSBUILD_SDIST_COMPRESSION", None, getenv)
+        self._set_best("incremental_pack", None, "PYMSBUILD_INCREMENTAL_PACK", None, getenv)
+        self._set_best("deterministic", None, "PYMSBUILD_DETERMINISTIC", None, getenv)
+        self._set_best("source_date_epoch", None, "SOURCE_DATE_EPOCH", None, getenv)
+        self._set_best("wheel_compression", "WheelCompression", "PYMSBUILD_WHEEL_COMPRESSION", None, getenv)
 
         self._set_best("ext_suffix", "ExtSuffix", "PYMSBUILD_EXT_SUFFIX", None, getenv)
         self._set_best("abi_tag", "AbiTag", "PYMSBUILD_ABI_TAG", None, getenv)
@@ -180,6 +721,7 @@ class BuildState:
         self._set_best("wheel_tag", "WheelTag", "PYMSBUILD_WHEEL_TAG", None, getenv)
         self._set_best("platform", None, "PYMSBUILD_PLATFORM", None, getenv)
         self._set_best("configuration", None, "PYMSBUILD_CONFIGURATION", "Release", getenv)
+        self._set_best("pgo_training", None, "PYMSBUILD_PGO_TRAINING", None, getenv)
 
         if in_place:
             default_target = "RelayoutInPlace" if self.force else "LayoutInPlace"
@@ -239,6 +781,17 @@ class BuildState:
             self.package = self.config.PACKAGE
             type(self).current = None
 
+    def _locate_msbuild(self, getenv=os.getenv):
+        self._set_best("msbuild_exe", None, "MSBUILD", None, getenv)
+        if self.msbuild_exe is None:
+            self.msbuild_exe = locate_msbuild()
+        if isinstance(self.msbuild_exe, str):
+            if Path(self.msbuild_exe).is_file():
+                self.msbuild_exe = [self.msbuild_exe]
+            else:
+                import shlex
+                self.msbuild_exe = shlex.split(self.msbuild_exe)
+
     def _set_best(self, key, metakey, envkey, default, getenv):
         if getattr(self, key, None):
             self.log("Build state property", key, "already set to", getattr(self, key))
@@ -286,6 +839,7 @@ class BuildState:
             self.temp_dir,
             self.source_dir,
             self.config_file,
+            self.configuration,
         ))
         self.log("Generated", self.project)
 
@@ -293,6 +847,8 @@ class BuildState:
 
     def build(self, **properties):
         self.finalize()
+        if str(self.configuration).casefold() == "pgo" and not properties.get("Configuration"):
+            return self._build_pgo(**properties)
         project = self.generate()
         self.log("Compiling", project, "with", *self.msbuild_exe, "({})".format(self.target))
         if not project.is_file():
@@ -304,6 +860,9 @@ class BuildState:
             except LookupError:
                 self.write("WARNING:", self.platform, "is not a known platform. Projects may not compile")
                 properties["Platform"] = self.platform
+        if str(properties["Configuration"]).casefold() in {"pginstrument", "pgoptimize"} \
+                and not str(properties["Platform"]).startswith("POSIX"):
+            raise RuntimeError("Profile-guided optimization is only supported by the GCC toolset on POSIX platforms")
         properties.setdefault("HostPython", sys.executable)
         if sys.base_prefix != sys.prefix:
             base_host = getattr(sys, "_base_executable", None)
@@ -330,7 +889,36 @@ class BuildState:
         properties.setdefault("PythonConfig", self.python_config)
         properties.setdefault("PythonIncludes", self.python_includes)
         properties.setdefault("PythonLibs", self.python_libs)
-        rsp = self.temp_dir / f"{project}.{os.getpid()}.rsp"
+        if not _WINDOWS and str(properties["Platform"]).startswith("POSIX"):
+            self._calculate_python_flags(properties)
+            properties.setdefault("DefaultPythonCFlags", _escape_property(self.python_cflags))
+            properties.setdefault("DefaultPythonLDFlags", _escape_property(self.python_ldflags))
+            properties.setdefault("DefaultPythonEmbedLDFlags", _escape_property(self.python_embed_ldflags))
+        if self._dllpack_shared_dir:
+            properties.setdefault("DllPackSharedDir", self._dllpack_shared_dir)
+        if self._reference_manifest:
+            properties.setdefault("LayoutReferenceManifest", self._reference_manifest)
+        properties.setdefault("DefaultParallelCompile", self.parallel_compile)
+        if self.compile_cache and not str(properties["Platform"]).startswith("POSIX"):
+            self.write("WARNING: The compiler cache is not supported by MSVC and will not be used")
+        properties.setdefault("DefaultCompileCache", self.compile_cache)
+        properties.setdefault("DefaultCompileCacheSize", self.compile_cache_size)
+        properties.setdefault("CompileCacheStatsFile", self.temp_dir / "compile_cache_stats.txt")
+        properties.setdefault("WheelCompressionFile", self.temp_dir / "wheel_compression.txt")
+        properties.setdefault("LayoutManifest", self.manifest_file)
+        cache_key = self._get_build_cache_key(properties)
+        # The Layout targets rewrite the manifest
+        self._manifest = None
+        if cache_key and _cache.restore(self.build_cache_dir, cache_key):
+            self.write("Restored build results from cache")
+            return
+        stats_file = properties.get("CompileCacheStatsFile")
+        if stats_file:
+            try:
+                Path(stats_file).unlink()
+            except FileNotFoundError:
+                pass
+        rsp = self.temp_dir / f"{project.name}.{os.getpid()}.rsp"
         with rsp.open("w", encoding="utf-8-sig") as f:
             print(project, file=f)
             print("/nologo", file=f)
@@ -350,21 +938,184 @@ class BuildState:
             with rsp.open("r", encoding="utf-8-sig") as f:
                 self.log(" ".join(map(str.strip, f)))
             self.log()
+        args, env = [], None
+        if _is_true(self.node_reuse):
+            node_reuse = get_node_reuse_options(self.msbuild_exe)
+            self.log("Reusing MSBuild nodes with", *node_reuse.args, *(f"{k}={v}" for k, v in node_reuse.env.items()))
+            args = node_reuse.args
+            if node_reuse.env:
+                env = {**os.environ, **node_reuse.env}
         _run = subprocess.check_output if self.quiet else subprocess.check_call
         try:
-            _run([*self.msbuild_exe, f"@{rsp}"], stderr=subprocess.STDOUT)
+            _run([*self.msbuild_exe, *args, f"@{rsp}"], stderr=subprocess.STDOUT, env=env)
         except subprocess.CalledProcessError as ex:
             if self.quiet:
                 if _WINDOWS:
                     print(ex.stdout.decode("mbcs", "replace"))
                 else:
                     print(ex.stdout.decode("utf-8", "replace"))
+            self._report_compile_cache(stats_file)
             sys.exit(1)
         else:
             try:
                 rsp.unlink()
             except OSError:
                 pass
+        self._report_compile_cache(stats_file)
+        if cache_key:
+            self._store_build_cache(cache_key, properties)
+
+    def _build_pgo(self, **properties):
+        # Builds instrumented modules, runs the training script against them,
+        # and then rebuilds using the collected profile. Configuration may be
+        # passed but empty, so it is removed before we override it.
+        properties.pop("Configuration", None)
+        if not self.pgo_training:
+            raise RuntimeError("No training script was specified. Set PYMSBUILD_PGO_TRAINING")
+        training = self.source_dir / self.pgo_training
+        if not training.is_file():
+            raise FileNotFoundError(training)
+
+        self.write("Building instrumented modules")
+        self.build(**properties, Configuration="PGInstrument")
+
+        if self.target in {"LayoutInPlace", "RelayoutInPlace"}:
+            root = self.source_dir
+        elif self.layout_dir and self.layout_dir.is_dir():
+            root = self.layout_dir
+        else:
+            root = self.build_dir
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join(p for p in [str(root), env.get("PYTHONPATH")] if p)
+        self.write("Running", training, "against", root)
+        subprocess.check_call([sys.executable, str(training)], cwd=self.source_dir, env=env)
+
+        self.write("Building optimized modules")
+        self.build(**properties, Configuration="PGOptimize")
+
+    def _calculate_python_flags(self, properties):
+        """Runs python-config once to find the compiler and linker flags.
+
+        The results are saved in the temporary directory and reused until
+        the interpreter, PYTHON_CONFIG or sysconfig data change. If any of
+        the commands fail, the flags are left unset, and each project will
+        run python-config itself and report the error.
+        """
+        if self.python_cflags is not None and self.python_ldflags is not None:
+            return
+        cmd = self.python_config
+        if not cmd:
+            for host in (properties.get("HostPython"), properties.get("BaseHostPython")):
+                if host and Path(f"{host}-config").is_file():
+                    cmd = f"{host}-config"
+                    break
+            else:
+                cmd = "python3-config"
+        parts = [properties.get("HostPython"), cmd]
+        exe = shutil.which(str(cmd).partition(" ")[0])
+        if exe:
+            st = os.stat(exe)
+            parts.extend((exe, st.st_size, st.st_mtime_ns))
+        from ._load_sysconfig import find_sysconfig_file
+        sysconfig_file = find_sysconfig_file()
+        key = _cache.get_key(*parts, files=[sysconfig_file] if sysconfig_file else [])
+
+        cache_file = self.temp_dir / "python_flags.txt"
+        cached = {}
+        try:
+            with open(cache_file, "r", encoding="utf-8") as f:
+                cached = dict(i.rstrip("\r\n").partition("\t")[::2] for i in f)
+        except OSError:
+            pass
+        if cached.get("key") != key:
+            self.log("Executing", cmd, "to calculate compiler flags")
+            cached = {"key": key}
+            for name, args in [
+                ("cflags", "--cflags"),
+                ("ldflags", "--ldflags"),
+                ("embed_ldflags", "--ldflags --embed"),
+            ]:
+                p = subprocess.run(
+                    f"{cmd} {args}",
+                    shell=True,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.DEVNULL,
+                    universal_newlines=True,
+                )
+                if p.returncode == 0:
+                    cached[name] = " ".join(p.stdout.split())
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(cache_file, "w", encoding="utf-8") as f:
+                for k, v in cached.items():
+                    print(k, v, sep="\t", file=f)
+        if "cflags" in cached and "ldflags" in cached:
+            self.python_cflags = cached["cflags"]
+            self.python_ldflags = cached["ldflags"]
+            self.python_embed_ldflags = cached.get("embed_ldflags")
+
+    def _report_compile_cache(self, stats_file):
+        if not stats_file:
+            return
+        hits = misses = 0
+        try:
+            with open(stats_file, "r", encoding="utf-8") as f:
+                for line in f:
+                    h, _, m = line.strip().partition("\t")
+                    hits += int(h)
+                    misses += int(m)
+        except (OSError, ValueError):
+            return
+        total = hits + misses
+        self.write("Compiler cache: {} hits, {} misses ({:.0%} hit rate)".format(
+            hits, misses, hits / total if total else 0
+        ))
+
+    def _get_build_cache_key(self, properties):
+        # Only layouts are cached, as all their outputs are known
+        if not self.build_cache_dir or self.force or self.target not in {"Layout", "LayoutSdist"}:
+            return None
+        from pymsbuild import __version__
+        inputs = _cache.read_inputs(
+            [self.source_dir, self.targets],
+            [self.build_dir, self.temp_dir, self.layout_dir, self.output_dir, self.build_cache_dir],
+            self.build_cache_dir / "inputs.txt",
+        )
+        return _cache.get_key(
+            __version__,
+            *self.msbuild_exe,
+            self.target,
+            *sorted(f"{k}={v}" for k, v in properties.items() if v is not None),
+            *_cache.read_environment(),
+            files=sorted(self.project.parent.glob("*.proj")),
+            inputs=inputs,
+        )
+
+    def _store_build_cache(self, key, properties):
+        manifest_file = properties.get("LayoutManifest")
+        manifest = _read_manifest(manifest_file, self.layout_dir) if manifest_file else None
+        if manifest is None:
+            self.log("Not caching build results because no layout manifest was written")
+            return
+        files = [self.layout_dir / rn for rn in manifest]
+        copy_files = [manifest_file]
+        compression_file = Path(properties.get("WheelCompressionFile") or "")
+        if compression_file.is_file():
+            copy_files.append(compression_file)
+        try:
+            _cache.store(self.build_cache_dir, key, files, copy_files)
+        except OSError as ex:
+            self.write("WARNING: Failed to cache build results:", ex)
+
+    def shutdown(self):
+        self._locate_msbuild()
+        node_reuse = get_node_reuse_options(self.msbuild_exe)
+        if not node_reuse.shutdown:
+            self.write("Shutdown is not supported by", *self.msbuild_exe,
+                       "- nodes will exit after being idle for a few minutes")
+            return
+        self.log("Shutting down MSBuild with", *node_reuse.shutdown)
+        _run = subprocess.check_output if self.quiet else subprocess.check_call
+        _run(node_reuse.shutdown, stderr=subprocess.STDOUT)
 
     def build_in_place(self):
         self.finalize(in_place=True)
@@ -421,17 +1172,42 @@ class BuildState:
         else:
             tar_name = self.sdist_name + ".tar"
 
-        rel_files = _relative_to_layout(files, self.layout_dir)
+        rel_files = _stat_relative_to_layout(self._layout_files(files), self.layout_dir, self.write)
+        rel_files = [(n, rn, st) for n, rn, st in rel_files if not n.match(str(self.state_file))]
+
+        level = _parse_gzip_level(self.sdist_compression)
+        threads = self._get_pack_threads()
+        epoch = self._get_source_date_epoch()
+        if epoch is not None:
+            rel_files.sort(key=lambda i: PurePath(i[1]).as_posix())
+
         import gzip, tarfile
-        with gzip.open(sdist, "w") as f_gz:
-            with tarfile.TarFile.open(tar_name, "w", fileobj=f_gz, format=tarfile.PAX_FORMAT) as f:
-                self.log("Packing files into", sdist)
-                for n, rn in rel_files:
-                    if n.match(str(self.state_file)):
-                        continue
-                    self.log("-", rn)
-                    f.add(n, arcname=rn)
-                self.log()
+        try:
+            with open(sdist, "wb") as f_raw:
+                # Deterministic sdists always use the block compressor, so that
+                # the result does not depend on the number of threads.
+                if threads > 1 or epoch is not None:
+                    f_gz = _ParallelGzipFile(str(sdist), f_raw, level, threads, mtime=epoch)
+                else:
+                    f_gz = gzip.GzipFile(str(sdist), "wb", level, f_raw)
+                with f_gz, tarfile.TarFile.open(tar_name, "w", fileobj=f_gz, format=tarfile.PAX_FORMAT) as f:
+                    self.log("Packing files into", sdist)
+                    if threads > 1:
+                        self.log("Using", threads, "threads")
+                    names = {}
+                    headers = [(n, rn, _tarinfo(f, rn, st, names, epoch)) for n, rn, st in rel_files]
+                    for n, rn, info in headers:
+                        self.log("-", rn)
+                        with open(n, "rb") as f_src:
+                            f.addfile(info, f_src)
+                    self.log()
+        except BaseException:
+            # Do not leave a truncated sdist behind
+            try:
+                sdist.unlink()
+            except OSError:
+                pass
+            raise
         self.write("Wrote sdist to", sdist)
         return sdist.name
 
@@ -458,13 +1234,20 @@ class BuildState:
         if not self.metadata_dir.is_dir():
             self.prepare_wheel_distinfo()
 
+        # The Layout target recorded every file it copied
+        manifest = dict(self._get_manifest() or {})
+
         # Copy metadata_dir into layout_dir
         if self.metadata_dir != self.layout_dir:
+            import time
+            start = time.time_ns()
             metadata = (self.metadata_dir / self.distinfo_name).glob("*")
-            for n, rn in _relative_to_layout(metadata, self.metadata_dir):
+            for n, rn in _relative_to_layout(metadata, self.metadata_dir, self.write):
                 n2 = self.layout_dir / rn
                 n2.parent.mkdir(parents=True, exist_ok=True)
-                shutil.copy(n, n2)
+                manifest[str(rn)] = _manifest_entry(n2, _copy_and_hash(n, n2), start)
+
+        self._save_manifest(manifest)
 
         if statefile:
             self._write_state("pack_wheel")
@@ -484,6 +1267,80 @@ class BuildState:
             self.layout_wheel(statefile=False)
             return self.pack_wheel()
 
+    def build_matrix(self):
+        self.finalize_metadata()
+        tags = _parse_matrix(self.matrix)
+        if not tags:
+            raise RuntimeError("No tags were specified. Pass '--tag' or set PYMSBUILD_MATRIX")
+
+        # Configuration and projects are prepared serially, as they may call
+        # back into the config file. Only the builds run concurrently.
+        # Unless PACKAGE is initialised for each tag, the projects do not
+        # depend on the tag and are only generated once.
+        shared = self.package is not None or not hasattr(self.config, "init_PACKAGE")
+        states = []
+        for tag in tags:
+            bs = self._matrix_state(tag)
+            self.log("Preparing", bs.wheel_tag, "in", bs.temp_dir)
+            if shared and states:
+                bs.project, bs.pkginfo = states[0].project, states[0].pkginfo
+            bs.prepare_wheel_distinfo()
+            states.append(bs)
+
+        threads = int(self.matrix_threads or 0)
+        if threads <= 0:
+            threads = min(len(states), os.cpu_count() or 1)
+
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(threads) as pool:
+            # The first tag is built alone, so that the others can reuse
+            # its tag-independent results rather than all generating them,
+            # and the digests of files linked from the same sources
+            states[0].layout_wheel(statefile=False)
+            for bs in states[1:]:
+                bs._reference_manifest = states[0].manifest_file
+            list(pool.map(lambda bs: bs.layout_wheel(statefile=False), states[1:]))
+            # Files that are the same for every tag, such as pure-Python
+            # modules, are compressed once and copied from the first wheel
+            wheels = [states[0].pack_wheel()]
+            for bs in states[1:]:
+                bs._reference_wheel = self.output_dir / wheels[0]
+            wheels.extend(pool.map(lambda bs: bs.pack_wheel(), states[1:]))
+        self.write("Wrote", len(wheels), "wheels to", self.output_dir)
+        return wheels
+
+    def _matrix_state(self, tag):
+        bs = type(self)()
+        for k in [
+            "verbose", "quiet", "force", "config", "package", "metadata",
+            "source_dir", "output_dir", "config_file", "configuration", "msbuild_exe",
+            "build_number", "pack_threads", "wheel_compression",
+            "incremental_pack", "deterministic", "source_date_epoch",
+            "node_reuse", "build_cache_dir", "parallel_compile", "compile_cache",
+            "compile_cache_size",
+        ]:
+            setattr(bs, k, getattr(self, k))
+        if tag.count("-") == 2:
+            bs.wheel_tag = tag
+        else:
+            bs.abi_tag = tag
+        name = re.sub(r"[^\w\d.-]+", "_", tag)
+        bs.build_dir = self.build_dir / name
+        bs.temp_dir = self.temp_dir / name
+        # DllPackage resources, including bytecode, do not depend on the tag
+        bs._dllpack_shared_dir = self.temp_dir / "dllpack-shared"
+        bs._perform_layout = False
+        bs.finalize()
+        # Allow per-ABI paths to be specified with placeholders
+        for k in ["python_config", "python_includes", "python_libs"]:
+            v = getattr(bs, k)
+            if isinstance(v, str) and "{" in v:
+                v = v.replace("{abi}", str(bs.abi_only))
+                v = v.replace("{platform}", str(bs.platform))
+                v = v.replace("{tag}", str(bs.wheel_tag))
+                setattr(bs, k, v)
+        return bs
+
     def pack_wheel(self, files=None):
         self.finalize()
         self.output_dir.mkdir(parents=True, exist_ok=True)
@@ -491,28 +1348,197 @@ class BuildState:
         wheel = self.output_dir / self.wheel_name
         record = []
         record_files = []
-        rel_files = _relative_to_layout(files, self.layout_dir)
+        import time
+        start = time.time_ns()
+        manifest = self._get_manifest()
+        rel_files = list(_stat_relative_to_layout(self._layout_files(files), self.layout_dir, self.write))
+        stats = {str(rn): st for n, rn, st in rel_files}
+        epoch = self._get_source_date_epoch()
+        if epoch is not None:
+            # Sort by name, with the dist-info directory at the end
+            rel_files = sorted(rel_files, key=lambda i: (
+                i[1].parts[0] == self.distinfo_name, PurePath(i[1]).as_posix()
+            ))
+        compression = self._get_compression_policy()
+        rel_files = ((n, rn, st, compression(n, rn), _check_manifest(manifest, rn, st))
+                     for n, rn, st in rel_files if not n.match(str(self.state_file)))
+
+        threads = self._get_pack_threads()
 
         import zipfile
-        with zipfile.ZipFile(wheel, "w", compression=zipfile.ZIP_DEFLATED) as f:
-            self.log("Packing files into", wheel)
-            for n, rn in rel_files:
-                if n.match(str(self.state_file)):
-                    continue
-                self.log("-", rn)
-                record.append(_add_and_record(f, n, rn))
-            for n in self.metadata_dir.glob(self.distinfo_name):
-                if n.is_dir():
-                    record_files.append(rf"{n.name}/RECORD")
-                    record.append(rf"{n.name}/RECORD,,")
-            record_file = "\n".join(record).encode("utf-8")
-            for n in record_files:
-                self.log("-", n)
-                f.writestr(n, record_file)
-            self.log()
+        previous = None
+        previous_wheel = None
+        if _is_true(self.incremental_pack) and wheel.is_file():
+            previous_wheel = wheel.with_name(wheel.name + ".old")
+            os.replace(wheel, previous_wheel)
+            try:
+                previous = zipfile.ZipFile(previous_wheel)
+            except zipfile.BadZipFile:
+                self.log("Ignoring invalid wheel", wheel)
+        elif self._reference_wheel:
+            try:
+                previous = zipfile.ZipFile(self._reference_wheel)
+            except (OSError, zipfile.BadZipFile):
+                self.log("Ignoring invalid wheel", self._reference_wheel)
+        try:
+            with zipfile.ZipFile(wheel, "w", compression=zipfile.ZIP_DEFLATED) as f:
+                # Records the policy, so that a later pack only reuses members
+                # that were compressed the same way
+                f.comment = f"pymsbuild-compression={self._get_compression_key()}".encode()
+                if previous and previous.comment != f.comment:
+                    self.log("Not reusing files from", previous.filename, "as the compression policy has changed")
+                    previous.close()
+                    previous = None
+                if previous and not _ZIP_RAW_WRITES:
+                    self.log("Not reusing files from", previous.filename, "on this version of Python")
+                    previous.close()
+                    previous = None
+                if previous:
+                    self.log("Reusing unchanged files from", previous.filename)
+                    rel_files = self._find_unchanged(f, previous, rel_files, epoch)
+                else:
+                    rel_files = ((n, rn, c, d, None) for n, rn, st, c, d in rel_files)
+                self.log("Packing files into", wheel)
+                if threads > 1 and not _ZIP_RAW_WRITES:
+                    self.log("Packing with one thread on this version of Python")
+                    threads = 1
+                if threads > 1:
+                    self.log("Using", threads, "threads")
+                    record.extend(_add_and_record_parallel(f, rel_files, threads, self.log, epoch))
+                else:
+                    for n, rn, c, d, reuse in rel_files:
+                        if reuse:
+                            self.log("-", rn, "(unchanged)")
+                            record.append(reuse())
+                        else:
+                            self.log("-", rn)
+                            record.append(_add_and_record(f, n, rn, compression=c, digest=d, epoch=epoch))
+                for n in self.metadata_dir.glob(self.distinfo_name):
+                    if n.is_dir():
+                        record_files.append(rf"{n.name}/RECORD")
+                        record.append(rf"{n.name}/RECORD,,")
+                record_file = "\n".join(record).encode("utf-8")
+                for n in record_files:
+                    self.log("-", n)
+                    if epoch is not None:
+                        n = _zipinfo(n, (max(_ZIP_EPOCH, epoch), 0o644))
+                        n.compress_type = zipfile.ZIP_DEFLATED
+                    f.writestr(n, record_file)
+                self.log()
+        except BaseException:
+            if previous:
+                previous.close()
+            if previous_wheel:
+                # Keep the previous wheel rather than a partial new one
+                os.replace(previous_wheel, wheel)
+            raise
+        if previous:
+            previous.close()
+        if previous_wheel:
+            previous_wheel.unlink()
+        # Remember the digests so that the next pack need not hash the files
+        new_manifest = {}
+        for i in record:
+            rn, digest, size = i.rsplit(",", 2)
+            if digest and rn in stats:
+                new_manifest[rn] = _manifest_row(stats[rn], digest, start)
+        self._save_manifest(new_manifest)
         self.write("Wrote wheel to", wheel)
         return wheel.name
 
+    def _get_pack_threads(self):
+        threads = int(self.pack_threads or 1)
+        if threads <= 0:
+            threads = os.cpu_count() or 1
+        return threads
+
+    def _get_source_date_epoch(self):
+        # Returns None unless deterministic archives were requested
+        if not _is_true(self.deterministic):
+            return None
+        return int(self.source_date_epoch or _ZIP_EPOCH)
+
+    def _find_unchanged(self, zipfile, previous, files, epoch=None):
+        old_record = _read_wheel_record(previous, self.distinfo_name)
+        for n, rn, st, c, d in files:
+            reuse = None
+            try:
+                old_digest, old_size, info = old_record[str(rn)]
+            except KeyError:
+                old_size = None
+            # Files with a different size are never read here. Otherwise,
+            # the manifest usually knows the hash without reading the file.
+            if old_size == st.st_size:
+                d = d or _hash_file(n)
+                if d == old_digest and (c == "auto" or _get_compression(c, n)[0] == info.compress_type):
+                    record = "{},{},{}".format(rn, d, old_size)
+                    attrs = _deterministic_attrs(n, epoch) if epoch is not None else None
+                    reuse = lambda info=info, record=record, attrs=attrs: _copy_compressed(
+                        zipfile, previous, info, record, attrs
+                    )
+            yield n, rn, c, d, reuse
+
+    def _read_compression_items(self):
+        # Per-file WheelCompression metadata is written by the Layout target
+        item_file = self.temp_dir / "wheel_compression.txt"
+        if not item_file.is_file():
+            return []
+        items = []
+        with item_file.open("r", encoding="utf-8-sig") as f:
+            for i in f:
+                n, _, c = i.strip().rpartition("=")
+                if n:
+                    items.append((n, _parse_compression(c)))
+        return items
+
+    def _get_compression_key(self):
+        # Identifies the policy that members were compressed with, as the
+        # deflate level cannot be read back from an existing wheel
+        import hashlib
+        hasher = hashlib.sha256(repr(_parse_compression_policy(self.wheel_compression)).encode())
+        for n, c in sorted(
+            (PurePath(os.path.relpath(n, self.layout_dir)).as_posix(), repr(c))
+            for n, c in self._read_compression_items()
+        ):
+            hasher.update(f"\0{n}={c}".encode("utf-8", "surrogateescape"))
+        return hasher.hexdigest()
+
+    def _get_compression_policy(self):
+        patterns = _parse_compression_policy(self.wheel_compression)
+        default = next((c for k, c in patterns if k == "*"), None)
+        patterns = [(k, c) for k, c in patterns if k != "*"]
+        items = {os.path.normcase(os.path.abspath(n)): c for n, c in self._read_compression_items()}
+
+        def _get(n, rn):
+            try:
+                return items[os.path.normcase(os.path.abspath(n))]
+            except KeyError:
+                pass
+            for k, c in patterns:
+                if PurePath(rn).match(k):
+                    return c
+            return default
+        return _get
+
+    def _layout_files(self, files=None):
+        # Files recorded in the manifest are packed without scanning the layout
+        if files is None:
+            manifest = self._get_manifest()
+            if manifest:
+                return list(manifest)
+        return files
+
+    def _save_manifest(self, manifest):
+        self._manifest = manifest
+        if self.manifest_file:
+            self.manifest_file.parent.mkdir(parents=True, exist_ok=True)
+            _write_manifest(self.manifest_file, self.layout_dir, manifest)
+
+    def _get_manifest(self):
+        if self._manifest is None and self.manifest_file:
+            self._manifest = _read_manifest(self.manifest_file, self.layout_dir)
+        return self._manifest
+
     def prepare_wheel_distinfo(self):
         self.finalize()
         self.generate()
@@ -548,7 +1574,10 @@ class BuildState:
             for k, v in self.layout_metadata.items():
                 print(k, "=", v, sep="", file=f)
             print("# BEGIN FILES", file=f)
-            for n, rn in _relative_to_layout(None, self.layout_dir):
+            files = self._layout_files()
+            if files is None:
+                files = (rn for n, rn in _relative_to_layout(None, self.layout_dir, self.write))
+            for rn in files:
                 print(rn, file=f)
 
     def pack(self):
@@ -569,7 +1598,7 @@ class BuildState:
                     setattr(self, k, v)
                 else:
                     self.layout_metadata[k] = v
-            for k in ["layout_dir", "output_dir", "build_dir", "temp_dir", "metadata_dir"]:
+            for k in ["layout_dir", "output_dir", "build_dir", "temp_dir", "metadata_dir", "manifest_file"]:
                 v = getattr(self, k, None)
                 if v:
                     setattr(self, k, Path(v))
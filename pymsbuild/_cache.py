@@ -0,0 +1,175 @@
+import hashlib
+import os
+import shutil
+
+from pathlib import Path
+
+# Number of build results to keep in the cache directory
+MAX_ENTRIES = 10
+
+# Directories that never contain build inputs
+_IGNORE_DIRS = {"__pycache__", "node_modules"}
+
+# Environment variables that affect the build, in addition to PYMSBUILD_*
+_ENVIRONMENT = {"CC", "CXX", "CFLAGS", "LDFLAGS"}
+
+
+def _hash_file(path):
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for b in iter(lambda: f.read(65536), b""):
+            hasher.update(b)
+    return hasher.hexdigest()
+
+
+def _link_or_copy(src, dest, link=True):
+    dest = Path(dest)
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        dest.unlink()
+    except FileNotFoundError:
+        pass
+    if link:
+        try:
+            os.link(src, dest)
+            return
+        except OSError:
+            pass
+    shutil.copy2(src, dest)
+
+
+def _read_table(file):
+    try:
+        with open(file, "r", encoding="utf-8") as f:
+            return [i.rstrip("\r\n").split("\t") for i in f if i.strip()]
+    except OSError:
+        return []
+
+
+def _write_table(file, rows):
+    with open(file, "w", encoding="utf-8") as f:
+        for r in rows:
+            print(*r, sep="\t", file=f)
+
+
+def read_inputs(roots, exclude, stat_file):
+    """Returns a sorted list of (path, sha256) for every file under roots.
+
+    Files whose size and mtime match the previous call are not hashed again.
+    Virtual environments, which contain a pyvenv.cfg, are skipped.
+    """
+    exclude = {os.path.normcase(os.path.abspath(p)) for p in exclude if p}
+    previous = {r[0]: r[1:] for r in _read_table(stat_file) if len(r) == 4}
+    current = {}
+    for root in roots:
+        for dirpath, dirnames, filenames in os.walk(root):
+            if "pyvenv.cfg" in filenames:
+                dirnames[:] = []
+                continue
+            dirnames[:] = [
+                d for d in dirnames
+                if not d.startswith(".") and d not in _IGNORE_DIRS
+                and os.path.normcase(os.path.join(dirpath, d)) not in exclude
+            ]
+            for f in filenames:
+                p = os.path.join(dirpath, f)
+                try:
+                    st = os.stat(p)
+                except OSError:
+                    continue
+                size, mtime = str(st.st_size), str(st.st_mtime_ns)
+                digest = None
+                try:
+                    old_size, old_mtime, digest = previous[p]
+                except KeyError:
+                    pass
+                else:
+                    if (old_size, old_mtime) != (size, mtime):
+                        digest = None
+                current[p] = size, mtime, digest or _hash_file(p)
+    Path(stat_file).parent.mkdir(parents=True, exist_ok=True)
+    _write_table(stat_file, sorted((p, *v) for p, v in current.items()))
+    return sorted((p, v[2]) for p, v in current.items())
+
+
+def read_environment(environ=None):
+    """Returns a sorted list of NAME=value for variables that affect the build."""
+    if environ is None:
+        environ = os.environ
+    return sorted(
+        f"{k}={v}" for k, v in environ.items()
+        if k.upper() in _ENVIRONMENT or k.upper().startswith("PYMSBUILD_")
+    )
+
+
+def get_key(*parts, files=(), inputs=()):
+    """Returns the cache key for the given values, file contents and inputs."""
+    hasher = hashlib.sha256()
+    for p in parts:
+        hasher.update(str(p).encode("utf-8", "surrogatepass"))
+        hasher.update(b"\0")
+    for f in files:
+        hasher.update(str(f).encode("utf-8", "surrogatepass"))
+        hasher.update(b"\0")
+        hasher.update(Path(f).read_bytes())
+        hasher.update(b"\0")
+    for p, digest in inputs:
+        hasher.update("{}\t{}\n".format(p, digest).encode("utf-8", "surrogatepass"))
+    return hasher.hexdigest()
+
+
+def store(cache_dir, key, files, copy_files=()):
+    """Saves files into the cache under key, replacing any existing entry.
+
+    Files are hard linked where possible, and restored to the same paths.
+    Files in copy_files are always copied, and should be used for any file
+    that may later be modified in place.
+    """
+    entry = Path(cache_dir) / key
+    tmp = entry.with_name(key + ".tmp")
+    if tmp.is_dir():
+        shutil.rmtree(tmp)
+    tmp.mkdir(parents=True)
+    rows = []
+    files = [(f, "link") for f in files] + [(f, "copy") for f in copy_files]
+    for i, (f, mode) in enumerate(files):
+        dest = tmp / str(i)
+        _link_or_copy(f, dest, mode == "link")
+        st = os.stat(dest)
+        rows.append((f, mode, st.st_size, st.st_mtime_ns))
+    _write_table(tmp / "index.txt", rows)
+    if entry.is_dir():
+        shutil.rmtree(entry)
+    os.replace(tmp, entry)
+    prune(cache_dir)
+
+
+def restore(cache_dir, key):
+    """Restores the files saved under key, returning False if there are none.
+
+    Entries whose files were modified after being saved are discarded.
+    """
+    entry = Path(cache_dir) / key
+    rows = _read_table(entry / "index.txt")
+    if not rows or any(len(r) != 4 for r in rows):
+        return False
+    for i, (f, mode, size, mtime) in enumerate(rows):
+        try:
+            st = os.stat(entry / str(i))
+        except OSError:
+            st = None
+        if not st or (str(st.st_size), str(st.st_mtime_ns)) != (size, mtime):
+            shutil.rmtree(entry, ignore_errors=True)
+            return False
+    for i, (f, mode, size, mtime) in enumerate(rows):
+        _link_or_copy(entry / str(i), f, mode == "link")
+    os.utime(entry)
+    return True
+
+
+def prune(cache_dir, max_entries=MAX_ENTRIES):
+    """Removes the least recently used entries beyond max_entries."""
+    entries = [p for p in Path(cache_dir).iterdir() if p.is_dir() and p.suffix != ".tmp"]
+    entries.sort(key=lambda p: p.stat().st_mtime, reverse=True)
+    for p in entries[max_entries:]:
+        shutil.rmtree(p, ignore_errors=True)
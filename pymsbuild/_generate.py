@@ -3,11 +3,14 @@ import sys
 
 from pathlib import PurePath, Path
 from ._types import Package, CProject, File, LiteralXML, Property, ItemDefinition, ConditionalValue
+from ._types import CSourceFile, SourceFile
 from ._writer import ProjectFileWriter
 
 from importlib.machinery import EXTENSION_SUFFIXES
 DEFAULT_PYD_SUFFIX = EXTENSION_SUFFIXES[-1]
 
+DEFAULT_UNITY_SIZE = 8
+
 LIBPATH = Path(sys.base_prefix) / "libs"
 INCPATH = Path(sys.base_prefix) / "include"
 SEP = os.path.sep
@@ -189,7 +192,93 @@ def _write_members(f, source_dir, members):
                 p.write_member(f, g)
 
 
-def _generate_c_project(project, build_dir, root_dir):
+def _get_unity_size(project):
+    v = project.options.get("UnityBuild")
+    if isinstance(v, str):
+        if v.lower() in {"", "0", "no", "false"}:
+            return 0
+        if v.lower() in {"yes", "true"}:
+            return DEFAULT_UNITY_SIZE
+        return int(v)
+    if v is True:
+        return DEFAULT_UNITY_SIZE
+    return int(v or 0)
+
+
+def _unity_members(members, source_dir, unity_dir, size):
+    """Replaces C sources in members with generated unity sources.
+
+Each generated file includes up to 'size' sources that share the same
+options. Sources with conditions, MSBuild variables or the
+'ExcludeFromUnityBuild' option are passed through unchanged, and all
+original sources are still included in sdists.
+"""
+    groups = {}
+    for n, p in members:
+        if (
+            not isinstance(p, CSourceFile)
+            or getattr(p, "condition", None)
+            or "$(" in str(p.source)
+            or p.options.get("ExcludeFromUnityBuild")
+        ):
+            yield n, p
+            continue
+        exclude = set()
+        for pattern in (getattr(p, "exclude", None) or "").split(os.pathsep):
+            if pattern:
+                exclude.update(p2 for n2, p2 in _resolve_wildcards(n, source_dir, pattern))
+        key = (
+            p.source.suffix.lower(),
+            tuple(sorted((k, str(v)) for k, v in p.options.items() if k != "Name")),
+        )
+        groups.setdefault(key, []).extend(sorted(
+            ((n2, Path(p2), p) for n2, p2 in _resolve_wildcards(n, source_dir, p.source) if p2 not in exclude),
+            key=lambda i: i[1],
+        ))
+
+    unity_dir.mkdir(parents=True, exist_ok=True)
+    written = set()
+    for (suffix, _), files in groups.items():
+        for i in range(0, len(files), size):
+            chunk = files[i:i + size]
+            if len(chunk) == 1:
+                n2, p2, p = chunk[0]
+                yield str(n2), CSourceFile(p2, n2.name, **p.options)
+                continue
+            unity = unity_dir / "unity{}{}".format(len(written), suffix)
+            written.add(unity)
+            content = "".join(
+                '#include "{}"\n'.format(str(p2).replace("\\", "/")) for _, p2, _ in chunk
+            )
+            # Only write when changed, so that incremental builds still work
+            try:
+                old = unity.read_text(encoding="utf-8")
+            except OSError:
+                old = None
+            if old != content:
+                unity.write_text(content, encoding="utf-8")
+            options = {**chunk[0][2].options, "IncludeInSdist": False, "ObjectFile": unity.name + ".o"}
+            yield unity.name, CSourceFile(unity, unity.name, **options)
+            for n2, p2, p in chunk:
+                yield str(n2), SourceFile(p2, n2.name, IncludeInSdist=p.options.get("IncludeInSdist", True))
+    for p in unity_dir.glob("unity*"):
+        if p not in written:
+            p.unlink()
+
+
+def _vc_configurations(configuration):
+    # The optimization configurations are only listed when they are used
+    configurations = ["Debug", "Release"]
+    c = str(configuration or "").casefold()
+    if c == "pgo":
+        configurations.extend(["PGInstrument", "PGOptimize"])
+    for extra in ["ReleaseLTO", "PGInstrument", "PGOptimize"]:
+        if c == extra.casefold() and extra not in configurations:
+            configurations.append(extra)
+    return configurations
+
+
+def _generate_c_project(project, build_dir, root_dir, configuration=None):
     build_dir = Path(build_dir)
     proj = build_dir / "{}.proj".format(project.name)
     root_dir = Path(root_dir)
@@ -199,12 +288,17 @@ def _generate_c_project(project, build_dir, root_dir):
         return Path(project.project_file)
 
     tname = project.options.get("TargetName", project.name)
-    with ProjectFileWriter(proj, tname, vc_platforms=True, root_namespace=project.name) as f:
+    vc_platforms = (None, _vc_configurations(configuration))
+    with ProjectFileWriter(proj, tname, vc_platforms=vc_platforms, root_namespace=project.name) as f:
         with f.group("PropertyGroup", Label="Globals"):
             f.add_property("SourceDir", ConditionalValue(source_dir, if_empty=True))
             f.add_property("SourceRootDir", ConditionalValue(root_dir, if_empty=True))
-        _write_project_references(f, project, build_dir, source_dir)
-        _write_members(f, source_dir, _all_members(project, recurse_if=lambda m: m is project))
+        _write_project_references(f, project, build_dir, source_dir, configuration)
+        members = _all_members(project, recurse_if=lambda m: m is project)
+        unity_size = _get_unity_size(project)
+        if unity_size > 1:
+            members = _unity_members(members, source_dir, build_dir / "{}.unity".format(project.name), unity_size)
+        _write_members(f, source_dir, members)
         for n, p in _all_members(project, recurse_if=lambda m: m is project, return_if=lambda m: isinstance(m, Package)):
             _write_members(
                 f,
@@ -227,7 +321,7 @@ def _generate_reference_metadata(relname, project, source_dir):
     }
 
 
-def _write_project_references(f, project, build_dir, source_dir):
+def _write_project_references(f, project, build_dir, source_dir, configuration=None):
     with f.group("ItemGroup", Label="ProjectReferences"):
         for n, p in _all_members(
             project,
@@ -235,7 +329,7 @@ def _write_project_references(f, project, build_dir, source_dir):
             make_prefix=lambda prefix, item: "{}{}/".format(prefix, item.name) if not isinstance(item, CProject) else prefix,
         ):
             fn = PurePath(n)
-            pdir = _generate_c_project(p, build_dir, source_dir)
+            pdir = _generate_c_project(p, build_dir, source_dir, configuration)
             try:
                 pdir = pdir.relative_to(Path(f.filename).parent)
             except ValueError:
@@ -248,7 +342,7 @@ def _write_project_references(f, project, build_dir, source_dir):
             )
 
 
-def generate(project, build_dir, source_dir, config_file=None):
+def generate(project, build_dir, source_dir, config_file=None, configuration=None):
     build_dir = Path(build_dir)
     root_dir = Path(source_dir)
     config_file = root_dir / (config_file or "_msbuild.py")
@@ -259,7 +353,7 @@ def generate(project, build_dir, source_dir, config_file=None):
         return Path(project.project_file)
 
     if isinstance(project, CProject):
-        return _generate_c_project(project, build_dir, root_dir)
+        return _generate_c_project(project, build_dir, root_dir, configuration)
 
     with ProjectFileWriter(proj, project.name) as f:
         with f.group("PropertyGroup"):
@@ -270,9 +364,11 @@ def generate(project, build_dir, source_dir, config_file=None):
                 f.add_property(k, v)
         f.add_import(f"$(PyMsbuildTargets){SEP}common.props")
         f.add_import(f"$(PyMsbuildTargets){SEP}package.props")
-        _write_project_references(f, project, build_dir, source_dir)
+        _write_project_references(f, project, build_dir, source_dir, configuration)
         with f.group("ItemGroup", Label="Sdist metadata"):
             f.add_item("Sdist", build_dir / "PKG-INFO", RelativeSource="PKG-INFO")
+            if (build_dir / SDIST_OPTIONS_FILE).is_file():
+                f.add_item("Sdist", build_dir / SDIST_OPTIONS_FILE, RelativeSource=SDIST_OPTIONS_FILE)
             f.add_item("Sdist", config_file, RelativeSource="_msbuild.py")
         _write_members(f, source_dir, _all_members(
             project,
@@ -307,9 +403,21 @@ def _write_metadata_description(f, value, source_dir):
     print(value, file=f)
 
 
+# Options from METADATA that also apply to wheels built from the sdist. They
+# are written to a separate file, as PKG-INFO becomes the wheel's METADATA.
+SDIST_OPTIONS = ["WheelCompression"]
+SDIST_OPTIONS_FILE = "PKG-OPTIONS"
+
+
+def _format_option(value):
+    if isinstance(value, dict):
+        return ";".join(f"{k}={v}" for k, v in value.items())
+    return value
+
+
 def generate_distinfo(distinfo, build_dir, source_dir):
     build_dir.mkdir(parents=True, exist_ok=True)
-    exclude = {k.casefold() for k in ["ExtSuffix", "AbiTag", "WheelTag"]}
+    exclude = {k.casefold() for k in ["ExtSuffix", "AbiTag", "WheelTag", *SDIST_OPTIONS]}
     with (build_dir / "PKG-INFO").open("w", encoding="utf-8") as f:
         description = None
         for k, vv in distinfo.items():
@@ -325,6 +433,18 @@ def generate_distinfo(distinfo, build_dir, source_dir):
             _write_metadata(f, k, vv, source_dir)
         if description:
             _write_metadata_description(f, description, source_dir)
+    sdist_options = {k.casefold() for k in SDIST_OPTIONS}
+    options = {k: _format_option(v) for k, v in distinfo.items() if k.casefold() in sdist_options}
+    if options:
+        with (build_dir / SDIST_OPTIONS_FILE).open("w", encoding="utf-8") as f:
+            for k, vv in options.items():
+                _write_metadata(f, k, vv, source_dir)
+    else:
+        try:
+            (build_dir / SDIST_OPTIONS_FILE).unlink()
+        except FileNotFoundError:
+            pass
+
 
 def readback_distinfo(pkg_info):
     distinfo = []
@@ -1,7 +1,9 @@
+import functools
 import os
 import shlex
 import shutil
 import subprocess
+import types
 
 from pathlib import Path
 from urllib.request import urlretrieve
@@ -28,3 +30,36 @@ def locate_msbuild():
         return shlex.split(exe)
 
     return _check_build("dotnet")
+
+
+# Cached so that repeated builds in one process only run MSBuild once.
+# The argument must be a tuple so that it can be used as the key.
+@functools.lru_cache()
+def _get_version(msbuild_exe):
+    out = subprocess.check_output(
+        [*msbuild_exe, "-version", "-nologo"],
+        encoding="ascii",
+        errors="replace",
+    )
+    return tuple(int(i) for i in out.strip().splitlines()[-1].split(".")[:2])
+
+
+def get_node_reuse_options(msbuild_exe):
+    """Returns the extra arguments and environment variables needed to keep
+    MSBuild running between builds, and the command to shut it down again.
+
+    The MSBuild server is used when 'dotnet build' is new enough to have one.
+    """
+    if Path(msbuild_exe[0]).stem.casefold() != "dotnet":
+        return types.SimpleNamespace(args=["-nodeReuse:true"], env={}, shutdown=None)
+    env = {}
+    try:
+        if _get_version(tuple(msbuild_exe)) >= (17, 4):
+            env["MSBUILDUSESERVER"] = "1"
+    except (OSError, ValueError, subprocess.CalledProcessError):
+        pass
+    return types.SimpleNamespace(
+        args=["-nodeReuse:true"],
+        env=env,
+        shutdown=[msbuild_exe[0], "build-server", "shutdown", "--msbuild"],
+    )
@@ -1,6 +1,7 @@
 import os
 import subprocess
 import sys
+import types
 
 from pathlib import Path
 
@@ -65,3 +66,16 @@ def locate_msbuild():
     # TODO: Also look for .NET Core SDK installation
 
     raise RuntimeError("Unable to locate msbuild.exe. Please provide it as %MSBUILD%")
+
+
+def get_node_reuse_options(msbuild_exe):
+    """Returns the extra arguments and environment variables needed to keep
+    MSBuild running between builds, and the command to shut it down again.
+
+    MSBuild.exe nodes cannot be shut down on request, but will exit after
+    being idle for a few minutes.
+    """
+    if Path(msbuild_exe[0]).stem.casefold() == "dotnet":
+        from ._locate_dotnet import get_node_reuse_options
+        return get_node_reuse_options(msbuild_exe)
+    return types.SimpleNamespace(args=["/nodeReuse:true"], env={}, shutdown=None)
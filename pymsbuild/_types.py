@@ -20,6 +20,7 @@ __all__ = [
     "SourceFile",
     "CSourceFile",
     "IncludeFile",
+    "PrecompiledHeader",
     "File",
     "Midl",
     "Manifest",
@@ -716,6 +717,29 @@ but they do not produce linkable outputs.
     _ITEMNAME = "ClInclude"
 
 
+class PrecompiledHeader(IncludeFile):
+    r"""Add a header file to precompile with gcc or clang.
+
+The header is compiled once per configuration and automatically
+included at the start of every C or C++ source in the project,
+so it should contain the large, rarely modified headers used by
+most of them (such as Python.h). Sources must not depend on it
+being included before any other header.
+
+The language is taken from the 'Language' option ('c' or 'c++').
+If not specified, headers ending in .hpp, .hh or .hxx are C++, and
+other headers are C++ only when the project has no C sources.
+At most one header per language should be specified.
+
+On Windows, this behaves the same as IncludeFile. MSVC precompiled
+headers are configured with the ClCompile PrecompiledHeader options.
+"""
+    options = {
+        **IncludeFile.options,
+        "Precompile": True,
+    }
+
+
 class RemoveFile(File):
     r"""Removes a file that has already been added.
 
@@ -6,10 +6,25 @@ class DllPackage(PydFile):
 This is the equivalent of a regular `Package`, but the output is a
 compiled DLL that exposes submodules and resources using an import hook.
 
-Add `Function` elements to link """
+Add `Function` elements to link
+
+Set `Compression` to "zlib" to compress code and resources that are at
+least `CompressionMinimumSize` bytes. Set `Compress` on individual files
+to override the size check for that file.
+
+Set `PackResources` to link all code and resources as a single object
+when building with gcc.
+
+Set `StartupOrder` to the path of a file listing the origins of files
+used at startup, as written by `pymsbuild.dllpack_profile --order`, to
+place those files first and together in the built module. """
     options = {
         **PydFile.options,
         "EncryptionKeyVariable": "",
+        "Compression": "",
+        "CompressionMinimumSize": "1024",
+        "PackResources": "false",
+        "StartupOrder": "",
     }
 
     class Imports(ImportGroup):
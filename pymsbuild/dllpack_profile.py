@@ -0,0 +1,278 @@
+r"""Profiles imports from DLL-packed packages.
+
+Run a script or module with profiling enabled using:
+
+```
+python -m pymsbuild.dllpack_profile [--trace FILE] [--report FILE] [--order FILE] script.py [args]
+python -m pymsbuild.dllpack_profile [--trace FILE] [--report FILE] [--order FILE] -m module [args]
+```
+
+Or call `start()` before importing any packed packages, and `stop()` to
+return the `Profiler` with the results.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+
+__all__ = ["Profiler", "start", "stop"]
+
+
+class ModuleRecord:
+    def __init__(self, name):
+        self.name = name
+        self.pack = None
+        self.origin = None
+        self.lookup_ns = 0
+        self.unmarshal_ns = 0
+        self.exec_ns = 0
+        self.exec_self_ns = 0
+        self.resource_bytes = 0
+
+
+class _TimedFinder:
+    """Wraps the meta path finder of a packed package to time lookups."""
+    def __init__(self, finder, profiler):
+        self._finder = finder
+        self._profiler = profiler
+        self.__name__ = finder.__name__
+
+    def __getattr__(self, attr):
+        return getattr(self._finder, attr)
+
+    def find_spec(self, fullname, path=None, target=None):
+        start = time.perf_counter_ns()
+        spec = self._finder.find_spec(fullname, path, target)
+        if spec is not None:
+            self._profiler._on_lookup(fullname, start, time.perf_counter_ns())
+        return spec
+
+
+class Profiler:
+    r"""Records lookup, unmarshal and execution times for packed modules.
+
+Times are measured using the 'pymsbuild.dllpack.*' audit events and by
+wrapping the finder of each packed package. The lookup time of the
+top-level package is not recorded, as it is found by the usual
+extension module finder.
+"""
+    _hook_installed = False
+    _active = None
+
+    def __init__(self):
+        self.modules = {}
+        self.trace = []
+        # Origins of code and resources in the order they were first loaded
+        self.load_order = {}
+        # Resources read while no packed module was executing
+        self.other_resource_bytes = 0
+        self._pid = os.getpid()
+        self._origin = time.perf_counter_ns()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _record(self, name):
+        try:
+            return self.modules[name]
+        except KeyError:
+            with self._lock:
+                return self.modules.setdefault(name, ModuleRecord(name))
+
+    def _state(self):
+        try:
+            return self._local.pending, self._local.stack
+        except AttributeError:
+            self._local.pending = {}
+            self._local.stack = []
+            return self._local.pending, self._local.stack
+
+    def _add_trace(self, name, cat, start, end=None, **args):
+        e = {
+            "name": name,
+            "cat": cat,
+            "ph": "X",
+            "ts": (start - self._origin) / 1000,
+            "pid": self._pid,
+            "tid": threading.get_ident(),
+            "args": args,
+        }
+        if end is None:
+            e["ph"] = "i"
+            e["s"] = "t"
+        else:
+            e["dur"] = (end - start) / 1000
+        self.trace.append(e)
+
+    def _on_lookup(self, name, start, end):
+        self._record(name).lookup_ns += end - start
+        self._add_trace(name, "lookup", start, end)
+
+    def _on_event(self, event, args, now):
+        pending, stack = self._state()
+        if event in ("pymsbuild.dllpack.load_pyc", "pymsbuild.dllpack.load_bytes", "pymsbuild.dllpack.load_view"):
+            if args[1]:
+                self.load_order.setdefault(args[1], None)
+        if event == "pymsbuild.dllpack.load_pyc":
+            pending[args[1]] = now
+        elif event == "pymsbuild.dllpack.exec_module":
+            pack, name, origin = args
+            r = self._record(name)
+            r.pack = pack
+            r.origin = origin
+            start = pending.pop(origin, None)
+            if start is not None:
+                r.unmarshal_ns += now - start
+                self._add_trace(name, "unmarshal", start, now)
+            stack.append([r, now, 0])
+        elif event == "pymsbuild.dllpack.exec_module_done":
+            while stack:
+                r, start, child_ns = stack.pop()
+                if r.name == args[1]:
+                    break
+            else:
+                return
+            r.exec_ns += now - start
+            r.exec_self_ns += now - start - child_ns
+            self._add_trace(r.name, "exec", start, now)
+            if stack:
+                stack[-1][2] += now - start
+        elif event in ("pymsbuild.dllpack.load_bytes", "pymsbuild.dllpack.load_view"):
+            size = args[2] if len(args) > 2 else 0
+            if stack:
+                stack[-1][0].resource_bytes += size
+            else:
+                self.other_resource_bytes += size
+            self._add_trace(args[1], "resource", now, size=size)
+        if event in ("pymsbuild.dllpack.makespec", "pymsbuild.dllpack.exec_module"):
+            # The finder is added to sys.meta_path while the package loads
+            self._wrap_finders()
+
+    def _wrap_finders(self):
+        for i, finder in enumerate(sys.meta_path):
+            if isinstance(finder, _TimedFinder):
+                continue
+            if getattr(finder, "__name__", "").startswith("DllPackFinder_"):
+                sys.meta_path[i] = _TimedFinder(finder, self)
+
+    @classmethod
+    def _audit_hook(cls, event, args):
+        self = cls._active
+        if self is not None and event.startswith("pymsbuild.dllpack."):
+            self._on_event(event, args, time.perf_counter_ns())
+
+    def start(self):
+        """Starts recording events.
+
+Audit hooks cannot be removed, so only one profiler may be active at a
+time."""
+        if Profiler._active is not None:
+            raise RuntimeError("a profiler is already active")
+        if not Profiler._hook_installed:
+            sys.addaudithook(Profiler._audit_hook)
+            Profiler._hook_installed = True
+        Profiler._active = self
+        self._wrap_finders()
+        return self
+
+    def stop(self):
+        """Stops recording events and unwraps any finders."""
+        if Profiler._active is self:
+            Profiler._active = None
+        sys.meta_path[:] = [
+            f._finder if isinstance(f, _TimedFinder) else f
+            for f in sys.meta_path
+        ]
+        return self
+
+    def report(self, file=None):
+        """Writes a table of recorded modules, slowest first."""
+        file = file or sys.stdout
+        ms = lambda ns: "{:.3f}".format(ns / 1000000)
+        rows = [("Module", "Lookup (ms)", "Unmarshal (ms)", "Exec (ms)", "Self (ms)", "Resources (bytes)")]
+        for r in sorted(self.modules.values(), key=lambda r: (-r.exec_ns, r.name)):
+            rows.append((
+                r.name,
+                ms(r.lookup_ns),
+                ms(r.unmarshal_ns),
+                ms(r.exec_ns),
+                ms(r.exec_self_ns),
+                str(r.resource_bytes),
+            ))
+        widths = [max(len(r[i]) for r in rows) for i in range(len(rows[0]))]
+        for row in rows:
+            print(row[0].ljust(widths[0]), *(c.rjust(w) for c, w in zip(row[1:], widths[1:])), sep="  ", file=file)
+        if self.other_resource_bytes:
+            print(file=file)
+            print("Resources read outside of packed modules:", self.other_resource_bytes, "bytes", file=file)
+
+    def write_trace(self, file):
+        """Writes recorded events in the Trace Event Format.
+
+The file may be loaded into chrome://tracing or https://ui.perfetto.dev/
+"""
+        with open(file, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": self.trace, "displayTimeUnit": "ms"}, f)
+
+    def write_order(self, file):
+        """Writes the origin of each loaded file in the order it was loaded.
+
+The file may be passed as the `StartupOrder` option of a `DllPackage` to
+place these files first when building.
+"""
+        with open(file, "w", encoding="utf-8") as f:
+            for origin in self.load_order:
+                print(origin, file=f)
+
+
+def start():
+    """Starts and returns a new profiler."""
+    return Profiler().start()
+
+
+def stop():
+    """Stops and returns the active profiler, if any."""
+    p = Profiler._active
+    if p:
+        p.stop()
+    return p
+
+
+def main(args=None):
+    import argparse
+    import runpy
+
+    parser = argparse.ArgumentParser("pymsbuild.dllpack_profile")
+    parser.add_argument("--trace", metavar="FILE", help="Write a trace event JSON file")
+    parser.add_argument("--report", metavar="FILE", help="Write the report to a file instead of stderr")
+    parser.add_argument("--order", metavar="FILE", help="Write the order that packed files were loaded")
+    parser.add_argument("-m", dest="module", action="store_true", help="Run a module instead of a script")
+    parser.add_argument("target", help="The script or module to run")
+    parser.add_argument("args", nargs=argparse.REMAINDER, help="Arguments to pass to the target")
+    ns = parser.parse_args(args)
+
+    sys.argv[:] = [ns.target, *ns.args]
+    if not ns.module:
+        sys.path.insert(0, os.path.dirname(os.path.abspath(ns.target)))
+    profiler = start()
+    try:
+        if ns.module:
+            runpy.run_module(ns.target, run_name="__main__", alter_sys=True)
+        else:
+            runpy.run_path(ns.target, run_name="__main__")
+    finally:
+        profiler.stop()
+        if ns.report:
+            with open(ns.report, "w", encoding="utf-8") as f:
+                profiler.report(f)
+        else:
+            profiler.report(sys.stderr)
+        if ns.trace:
+            profiler.write_trace(ns.trace)
+        if ns.order:
+            profiler.write_order(ns.order)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+import argparse
+import hashlib
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+DEFAULT_CACHE_SIZE_MB = 1024
+
+parser = argparse.ArgumentParser()
+parser.add_argument("-j", metavar="JOBS", type=int, default=1, help="Maximum number of concurrent compiles (0 for one per CPU)")
+parser.add_argument("--cache", metavar="DIR", type=Path, required=False, help="Object file cache directory")
+parser.add_argument("--cache-size", metavar="MB", type=int, default=DEFAULT_CACHE_SIZE_MB, help="Maximum size of the cache")
+parser.add_argument("--stats", metavar="FILE", type=Path, required=False, help="File to append cache hit and miss counts to")
+parser.add_argument("commands", type=Path, help="File containing SOURCE<tab>NAME<tab>OBJECT<tab>COMMAND lines")
+
+
+def read_commands(file):
+    with open(file, "r", encoding="utf-8-sig") as f:
+        return [i.rstrip("\r\n").split("\t", 3) for i in f if i.strip()]
+
+
+def run(cmd):
+    p = subprocess.run(cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    return p.returncode, p.stdout.decode(errors="replace")
+
+
+class ObjectCache:
+    def __init__(self, root, max_size):
+        self.root = root
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._compiler_ids = {}
+        self._lock = threading.Lock()
+
+    def _compiler_id(self, compiler):
+        with self._lock:
+            try:
+                return self._compiler_ids[compiler]
+            except KeyError:
+                pass
+        try:
+            p = subprocess.run([compiler, "--version"], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+            cid = p.stdout
+        except OSError:
+            cid = b""
+        try:
+            st = os.stat(shutil.which(compiler) or compiler)
+            cid += f"\0{st.st_size}\0{st.st_mtime_ns}".encode()
+        except (OSError, TypeError):
+            pass
+        with self._lock:
+            self._compiler_ids[compiler] = cid
+        return cid
+
+    def get_key(self, cmd):
+        """Returns the cache key for a command, or None if it cannot be cached.
+
+        The key covers the compiler identity, the arguments other than output
+        paths, and the preprocessed source. Preprocessing also writes the
+        dependency file, so it is up to date even when the object is reused.
+        Only GCC-style commands are supported, as MSVC's compiler is not run
+        through this script.
+        """
+        args = shlex.split(cmd)
+        if "-c" not in args:
+            return None
+        # Instrumented objects refer to their own path, and optimized
+        # objects depend on profile data that is not part of the key
+        if any(a.startswith("-fprofile-") for a in args):
+            return None
+        pp_args, key_args = [], []
+        it = iter(args)
+        for a in it:
+            if a == "-o":
+                next(it, None)
+                continue
+            if a == "-MF":
+                pp_args.extend((a, next(it, "")))
+                continue
+            pp_args.append("-E" if a == "-c" else a)
+            key_args.append(a)
+        p = subprocess.run(pp_args, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        if p.returncode:
+            return None
+        hasher = hashlib.sha256(self._compiler_id(args[0]))
+        hasher.update("\0".join(key_args).encode("utf-8", "surrogateescape"))
+        hasher.update(b"\0")
+        # Debug information records the working directory, which relative
+        # paths in the object are resolved against
+        if any(a.startswith("-g") for a in args):
+            hasher.update(os.getcwd().encode("utf-8", "surrogateescape"))
+            hasher.update(b"\0")
+        hasher.update(p.stdout)
+        return hasher.hexdigest()
+
+    def _path(self, key):
+        return self.root / key[:2] / (key + ".o")
+
+    def restore(self, key, obj):
+        src = self._path(key)
+        try:
+            shutil.copyfile(src, obj)
+            os.utime(src)
+        except OSError:
+            return False
+        return True
+
+    def store(self, key, obj):
+        dest = self._path(key)
+        tmp = dest.with_name(f"{dest.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(obj, tmp)
+            os.replace(tmp, dest)
+        except OSError:
+            try:
+                tmp.unlink()
+            except OSError:
+                pass
+
+    def prune(self):
+        """Removes the least recently used objects until under max_size."""
+        entries = []
+        for p in self.root.glob("*/*.o"):
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, p))
+        total = sum(e[1] for e in entries)
+        entries.sort()
+        for _, size, p in entries:
+            if total <= self.max_size:
+                break
+            try:
+                p.unlink()
+            except OSError:
+                continue
+            total -= size
+
+    def compile(self, cmd, obj):
+        key = self.get_key(cmd)
+        if key and self.restore(key, obj):
+            with self._lock:
+                self.hits += 1
+            return 0, ""
+        rc, output = run(cmd)
+        with self._lock:
+            self.misses += 1
+        if key and not rc:
+            self.store(key, obj)
+        return rc, output
+
+
+def main(args):
+    commands = read_commands(args.commands)
+    jobs = max(1, min(args.j or os.cpu_count() or 1, len(commands)))
+    cache = None
+    if args.cache:
+        cache = ObjectCache(args.cache, args.cache_size * 1024 * 1024)
+
+    def compile_one(command):
+        source, name, obj, cmd = command
+        if cache:
+            return cache.compile(cmd, obj)
+        return run(cmd)
+
+    failed = []
+    with ThreadPoolExecutor(jobs) as pool:
+        # Results are collected in order so that output is never interleaved
+        for (source, name, obj, cmd), (rc, output) in zip(commands, pool.map(compile_one, commands)):
+            print(source, "->", name)
+            if output:
+                print(output, end="" if output.endswith("\n") else "\n")
+            if rc:
+                print(f"{source} : error PYMSBUILD001: Compiler exited with code {rc}")
+                failed.append(source)
+            sys.stdout.flush()
+
+    if cache:
+        cache.prune()
+        if args.stats:
+            with open(args.stats, "a", encoding="utf-8") as f:
+                print(cache.hits, cache.misses, sep="\t", file=f)
+
+    if failed:
+        print(f"error PYMSBUILD002: {len(failed)} of {len(commands)} files failed to compile")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(parser.parse_args()))
@@ -18,45 +18,136 @@ static int _get_data_ ## name(const char **start, Py_ssize_t *size) { \
 
 #define _REFERENCE_DATA(name) _get_data_ ## name
 
+#ifdef _DLLPACK_BLOB
+// All resources are packed into dllpack_blob.bin by dllpack-generate.py
+_IMPORT_DATA(dllpack_blob_bin)
+#define _REFERENCE_BLOB(offset, length) (offset), (length)
+#endif
+
 struct ENTRY {
     const char *name;
     const char *origin;
+#ifdef _DLLPACK_BLOB
+    // Offset is -1 if the entry has no data
+    Py_ssize_t offset;
+    Py_ssize_t length;
+#else
     _GET_DATA get;
+#endif
     char is_package;
+    // Zero if the data is not compressed
+    Py_ssize_t uncompressed_size;
 };
 
 typedef struct {
+    // Cached by dllpack.c
+    PyObject *module_spec_type;
+    PyObject *origin_root;
+    PyObject *data_names;
+    PyObject *decompress;
+    PyObject *data_cache;
 } ModuleState;
 
+// Implemented in dllpack.c
+static PyObject *decompress_buffer(ModuleState *ms, const struct ENTRY *entry, const char *buffer, Py_ssize_t cbBuffer);
+
+
+static int
+get_entry_data(const struct ENTRY *entry, const char **buffer, Py_ssize_t *cbBuffer)
+{
+#ifdef _DLLPACK_BLOB
+    const char *blob;
+    Py_ssize_t cbBlob;
+    if (entry->offset < 0 || !_get_data_dllpack_blob_bin(&blob, &cbBlob)
+        || entry->offset + entry->length > cbBlob) {
+        return 0;
+    }
+    *buffer = &blob[entry->offset];
+    *cbBuffer = entry->length;
+    return 1;
+#else
+    return entry->get && entry->get(buffer, cbBuffer);
+#endif
+}
+
 
 static PyObject *
 load_bytes(ModuleState *ms, const struct ENTRY *entry)
 {
     const char *buffer;
     Py_ssize_t cbBuffer;
-    if (!entry->get || !entry->get(&buffer, &cbBuffer)) {
+    if (!get_entry_data(entry, &buffer, &cbBuffer)) {
         PyErr_Format(PyExc_ModuleNotFoundError, "unable to open '%s'", entry->origin);
         return NULL;
     }
-    if (PySys_Audit("pymsbuild.dllpack.load_bytes", "ss", _DLLPACK_NAME, entry->origin) < 0) {
+    Py_ssize_t cbRead = entry->uncompressed_size ? entry->uncompressed_size : cbBuffer;
+    if (PySys_Audit("pymsbuild.dllpack.load_bytes", "ssn", _DLLPACK_NAME, entry->origin, cbRead) < 0) {
         return NULL;
     }
+    if (entry->uncompressed_size) {
+        return decompress_buffer(ms, entry, buffer, cbBuffer);
+    }
     return PyBytes_FromStringAndSize(buffer, cbBuffer);
 }
 
 
+static PyObject *
+load_view(ModuleState *ms, const struct ENTRY *entry)
+{
+    if (entry->uncompressed_size) {
+        // Decompressed data is always a copy
+        PyObject *b = load_bytes(ms, entry);
+        if (!b) {
+            return NULL;
+        }
+        PyObject *obj = PyMemoryView_FromObject(b);
+        Py_DECREF(b);
+        return obj;
+    }
+    const char *buffer;
+    Py_ssize_t cbBuffer;
+    if (!get_entry_data(entry, &buffer, &cbBuffer)) {
+        PyErr_Format(PyExc_ModuleNotFoundError, "unable to open '%s'", entry->origin);
+        return NULL;
+    }
+    if (PySys_Audit("pymsbuild.dllpack.load_view", "ssn", _DLLPACK_NAME, entry->origin, cbBuffer) < 0) {
+        return NULL;
+    }
+    // The data is part of the loaded image, which is never unloaded
+    return PyMemoryView_FromMemory((char *)buffer, cbBuffer, PyBUF_READ);
+}
+
+
 static PyObject *
 load_pyc(ModuleState *ms, const struct ENTRY *entry)
 {
     const char *buffer;
     Py_ssize_t cbBuffer = 0;
-    if (!entry->get || !entry->get(&buffer, &cbBuffer) || cbBuffer < _PYC_HEADER_LEN) {
+    if (!get_entry_data(entry, &buffer, &cbBuffer)
+        || (!entry->uncompressed_size && cbBuffer < _PYC_HEADER_LEN)) {
         PyErr_Format(PyExc_ModuleNotFoundError, "unable to import '%s' %zi", entry->name, cbBuffer);
         return NULL;
     }
     if (PySys_Audit("pymsbuild.dllpack.load_pyc", "ss", _DLLPACK_NAME, entry->origin) < 0) {
         return NULL;
     }
+    if (entry->uncompressed_size) {
+        PyObject *data = decompress_buffer(ms, entry, buffer, cbBuffer);
+        if (!data) {
+            return NULL;
+        }
+        if (PyBytes_GET_SIZE(data) < _PYC_HEADER_LEN) {
+            Py_DECREF(data);
+            PyErr_Format(PyExc_ModuleNotFoundError, "unable to import '%s' %zi", entry->name, PyBytes_GET_SIZE(data));
+            return NULL;
+        }
+        PyObject *obj = PyMarshal_ReadObjectFromString(
+            &PyBytes_AS_STRING(data)[_PYC_HEADER_LEN],
+            PyBytes_GET_SIZE(data) - _PYC_HEADER_LEN
+        );
+        Py_DECREF(data);
+        return obj;
+    }
     // Our .pyc has a header
     return PyMarshal_ReadObjectFromString(&buffer[_PYC_HEADER_LEN], cbBuffer - _PYC_HEADER_LEN);
 }
@@ -1,7 +1,13 @@
+import filecmp
+import hashlib
 import py_compile
 import os
+import shutil
 import sys
+import zlib
+from itertools import repeat
 from importlib.machinery import EXTENSION_SUFFIXES
+from importlib.util import MAGIC_NUMBER
 from pathlib import Path, PurePath
 
 try:
@@ -12,6 +18,17 @@ except ValueError:
 RESID_COUNTER = iter(range(1001, 999999))
 IMPORTERS_RESID = next(RESID_COUNTER)
 
+# When the number of jobs is not specified, each process should have at
+# least this many files to make starting it worthwhile
+MIN_FILES_PER_JOB = 32
+
+# Generated resource files are named for the hash of their inputs, and are
+# reused while they are listed in this file. Change CACHE_VERSION whenever
+# the contents of a resource file would change for the same inputs.
+CACHE_FILE = "dllpack-cache.txt"
+CACHE_VERSION = 1
+RESOURCE_CACHE = {}
+
 
 def groupby(iterator, key):
     result = {}
@@ -20,6 +37,78 @@ def groupby(iterator, key):
     return result
 
 
+def get_cache_key(sourcefile, *parts, encrypt=None, compress=None):
+    hasher = hashlib.sha256()
+    parts = [
+        CACHE_VERSION,
+        *parts,
+        compress.algorithm if compress else None,
+        compress.min_size if compress else None,
+        encrypt.key_id if encrypt else None,
+    ]
+    for p in parts:
+        hasher.update(str(p).encode("utf-8", "surrogatepass"))
+        hasher.update(b"\0")
+    with open(sourcefile, "rb") as f:
+        for b in iter(lambda: f.read(65536), b""):
+            hasher.update(b)
+    return hasher.hexdigest()[:32]
+
+
+def read_cache():
+    try:
+        with open(CACHE_FILE, "r", encoding="utf-8") as f:
+            rows = [i.rstrip("\r\n").split("\t") for i in f if i.strip()]
+    except OSError:
+        return
+    for r in rows:
+        if len(r) == 2 and r[1].isdigit() and Path(r[0]).is_file():
+            RESOURCE_CACHE[r[0]] = int(r[1])
+
+
+def write_cache(files):
+    """Saves the resource files used by files and deletes any others."""
+    used = {}
+    for f in files:
+        if f.RC_TYPE and f.cache_key:
+            used[f.resource_file().name] = f.uncompressed_size
+    for name in RESOURCE_CACHE:
+        if name not in used:
+            for p in (Path(name), Path(name + ".o")):
+                try:
+                    p.unlink()
+                except OSError:
+                    pass
+    with open(CACHE_FILE, "w", encoding="utf-8") as f:
+        for name, uncompressed_size in sorted(used.items()):
+            print(name, uncompressed_size, sep="\t", file=f)
+
+
+def store_resource(info, src, dest, encrypt=None, compress=None):
+    """Writes src to dest, compressing and encrypting as needed."""
+    tmp = dest.with_suffix(".tmp")
+    if compress and compress.should_compress(info, src):
+        info.uncompressed_size = compress.file(src=src, dest=tmp)
+        if info.uncompressed_size:
+            src = tmp
+    if encrypt:
+        encrypt.file(src=src, dest=dest)
+    else:
+        dest.write_bytes(src.read_bytes())
+    try:
+        tmp.unlink()
+    except OSError:
+        pass
+
+
+def restore_resource(info, dest):
+    try:
+        info.uncompressed_size = RESOURCE_CACHE[dest.name]
+    except KeyError:
+        return False
+    return True
+
+
 def parse_all(file):
     g = groupby(map(str.strip, file), key=lambda i: i.partition(":")[0].lower())
     factories = dict(
@@ -30,6 +119,11 @@ def parse_all(file):
         function=FunctionInfo,
         redirect=RedirectInfo,
         encrypt=EncryptInfo,
+        compression=CompressionInfo,
+        compress=CompressFileInfo,
+        blob=BlobInfo,
+        order=OrderInfo,
+        shared=SharedInfo,
     )
     return [
         factories.get(k, ErrorInfo)(line)
@@ -102,13 +196,36 @@ class CodeFileInfo:
         if path.match("*.pyc"):
             self._resource_file = self.sourcefile
         self.resid = next(RESID_COUNTER) if resid is None else resid
-
-    def resource_file(self, encrypt=None):
-        if not self._resource_file:
+        self.compress = None
+        self.uncompressed_size = 0
+        self.cache_key = None
+
+    def get_cache_key(self, encrypt=None, compress=None):
+        if not self.cache_key:
+            self.cache_key = get_cache_key(
+                self.sourcefile,
+                "code",
+                self.origin,
+                MAGIC_NUMBER.hex(),
+                PYC_OPTIMIZATION,
+                self.compress,
+                encrypt=encrypt,
+                compress=compress,
+            )
+        return self.cache_key
+
+    def resource_name(self, encrypt=None, compress=None):
+        return "pyc_{}.bin".format(self.get_cache_key(encrypt, compress))
+
+    def resource_file(self, encrypt=None, compress=None):
+        if self._resource_file:
+            return self._resource_file
+        dest = Path(self.resource_name(encrypt, compress))
+        if not restore_resource(self, dest):
             try:
                 pyc = Path(py_compile.compile(
                     str(self.sourcefile),
-                    "pyc{}.bin".format(self.resid),
+                    str(dest.with_suffix(".pyc")),
                     self.origin,
                     doraise=True,
                     optimize=PYC_OPTIMIZATION,
@@ -119,11 +236,10 @@ class CodeFileInfo:
                 print("[ERROR]Generating bytecode for", self.sourcefile)
                 traceback.print_exc()
                 sys.exit(1)
-            if encrypt:
-                self._resource_file = Path("pycx{}.bin".format(self.resid))
-                encrypt.file(src=pyc, dest=self._resource_file)
-            else:
-                self._resource_file = pyc
+            store_resource(self, pyc, dest, encrypt, compress)
+            pyc.unlink()
+            RESOURCE_CACHE[dest.name] = self.uncompressed_size
+        self._resource_file = dest
         return self._resource_file
 
     def check(self):
@@ -136,7 +252,10 @@ class CodeFileInfo:
 
     @classmethod
     def get_builtin(cls, resid, sourcefile, name):
-        return cls("code:${}:{}".format(name or sourcefile.stem, sourcefile), resid=resid)
+        f = cls("code:${}:{}".format(name or sourcefile.stem, sourcefile), resid=resid)
+        # Builtins are needed immediately, so are never compressed
+        f.compress = False
+        return f
 
 
 class DataFileInfo:
@@ -153,19 +272,37 @@ class DataFileInfo:
         self.sourcefile = path
         self._resource_file = None
         self.resid = next(RESID_COUNTER)
+        self.compress = None
+        self.uncompressed_size = 0
+        self.cache_key = None
 
     def check(self):
         if not self.sourcefile.is_file():
             return "Missing input: {}".format(self.sourcefile)
 
-    def resource_file(self, encrypt=None):
+    def get_cache_key(self, encrypt=None, compress=None):
+        if not self.cache_key:
+            # Identical resources share a key, and so are only stored once
+            self.cache_key = get_cache_key(
+                self.sourcefile,
+                "data",
+                self.compress,
+                encrypt=encrypt,
+                compress=compress,
+            )
+        return self.cache_key
+
+    def resource_name(self, encrypt=None, compress=None):
+        return f"data_{self.get_cache_key(encrypt, compress)}.bin"
+
+    def resource_file(self, encrypt=None, compress=None):
         if self._resource_file:
             return self._resource_file
-        self._resource_file = Path(f"data{self.resid}.bin")
-        if encrypt:
-            encrypt.file(src=self.sourcefile, dest=self._resource_file)
-        else:
-            self._resource_file.write_bytes(self.sourcefile.read_bytes())
+        dest = Path(self.resource_name(encrypt, compress))
+        if not restore_resource(self, dest):
+            store_resource(self, self.sourcefile, dest, encrypt, compress)
+            RESOURCE_CACHE[dest.name] = self.uncompressed_size
+        self._resource_file = dest
         return self._resource_file
 
     def remap_namespace(self, from_name, to_name):
@@ -244,6 +381,10 @@ class EncryptInfo:
                 self._key = key.encode("utf-8", "strict")
         return self._key
 
+    @property
+    def key_id(self):
+        return hashlib.sha256(self.key).hexdigest()
+
     def check(self):
         try:
             key = self.key
@@ -301,6 +442,191 @@ class EncryptInfo:
         return next((p for p in items if isinstance(p, cls)), None)
 
 
+class CompressionInfo:
+    RC_TYPE = None
+    RC_TABLE = None
+
+    def __init__(self, line):
+        algorithm, _, min_size = line.partition(":")[2].partition(":")
+        self.algorithm = algorithm.lower()
+        try:
+            self.min_size = int(min_size or "0")
+        except ValueError:
+            self.min_size = -1
+
+    def check(self):
+        if self.algorithm != "zlib":
+            return "Unsupported compression: {}".format(self.algorithm)
+        if self.min_size < 0:
+            return "Invalid minimum size for compression"
+
+    def should_compress(self, info, src):
+        if info.compress is not None:
+            return info.compress
+        return os.stat(src).st_size >= self.min_size
+
+    def file(self, src, dest):
+        """Compresses src into dest and returns the uncompressed size.
+
+        If compression does not make the file smaller, nothing is written
+        and zero is returned.
+        """
+        data = Path(src).read_bytes()
+        compressed = zlib.compress(data, 9)
+        if not data or len(compressed) >= len(data):
+            return 0
+        Path(dest).write_bytes(compressed)
+        return len(data)
+
+    @classmethod
+    def find(cls, items):
+        return next((p for p in items if isinstance(p, cls)), None)
+
+
+class CompressFileInfo:
+    RC_TYPE = None
+    RC_TABLE = None
+
+    def __init__(self, line):
+        self.name, _, compress = line.partition(":")[2].rpartition(":")
+        self.compress = compress.lower() in {"true", "yes", "1"}
+
+    def check(self):
+        pass
+
+    @classmethod
+    def apply(cls, items):
+        overrides = {PurePath(i.name): i.compress for i in items if isinstance(i, cls)}
+        if not overrides:
+            return
+        for i in items:
+            if i.RC_TYPE:
+                try:
+                    i.compress = overrides[PurePath(i.origin)]
+                except KeyError:
+                    pass
+
+
+class BlobInfo:
+    RC_TYPE = None
+    RC_TABLE = None
+    # Must match the name used in dllpack-gcc.h
+    FILE = "dllpack_blob.bin"
+
+    def __init__(self, line):
+        pass
+
+    def check(self):
+        pass
+
+    def write(self, resource_files):
+        """Concatenates resource_files and returns the offset of each.
+
+        The blob is only replaced when its contents change, so that it is
+        not linked again unnecessarily.
+        """
+        offsets = {}
+        tmp = Path(self.FILE + ".tmp")
+        with open(tmp, "wb") as f:
+            for p in resource_files:
+                offsets[p] = f.tell(), os.stat(p).st_size
+                with open(p, "rb") as f2:
+                    for b in iter(lambda: f2.read(65536), b""):
+                        f.write(b)
+        if Path(self.FILE).is_file() and filecmp.cmp(tmp, self.FILE, shallow=False):
+            tmp.unlink()
+        else:
+            os.replace(tmp, self.FILE)
+        return offsets
+
+    @classmethod
+    def find(cls, items):
+        return next((p for p in items if isinstance(p, cls)), None)
+
+
+class OrderInfo:
+    RC_TYPE = None
+    RC_TABLE = None
+
+    def __init__(self, line):
+        self.file = Path(line.partition(":")[2])
+
+    def check(self):
+        if not self.file.is_file():
+            return "Missing startup order file: {}".format(self.file)
+
+    def read(self):
+        with open(self.file, "r", encoding="utf-8-sig") as f:
+            lines = [i.strip().replace("\\", "/") for i in f]
+        order = {}
+        for i in lines:
+            if i and not i.startswith("#"):
+                order.setdefault(i, len(order))
+        return order
+
+    def apply(self, items):
+        """Reassigns resource IDs so that listed files come first, in order.
+
+        Resources are laid out in order of their IDs, so this keeps the
+        files used at startup together. Files that are not listed keep
+        their relative order after the listed files.
+        """
+        order = self.read()
+        files = [i for i in items if i.RC_TYPE]
+        resids = sorted(i.resid for i in files)
+        files.sort(key=lambda i: (order.get(i.origin.replace("\\", "/"), len(order)), i.resid))
+        for i, resid in zip(files, resids):
+            i.resid = resid
+
+    @classmethod
+    def find(cls, items):
+        return next((p for p in items if isinstance(p, cls)), None)
+
+
+class SharedInfo:
+    RC_TYPE = None
+    RC_TABLE = None
+
+    def __init__(self, line):
+        self.dir = Path(line.partition(":")[2])
+
+    def check(self):
+        pass
+
+    def restore(self, name):
+        """Copies a resource file generated by another build into the
+        current directory, returning False if it is not available."""
+        try:
+            size = int((self.dir / (name + ".size")).read_text(encoding="ascii"))
+            shutil.copyfile(self.dir / name, name)
+        except (OSError, ValueError):
+            return False
+        RESOURCE_CACHE[name] = size
+        return True
+
+    def store(self, path, uncompressed_size):
+        """Makes a resource file available to other builds.
+
+        Other builds may be reading and writing the same files, so each file
+        is replaced atomically, and the size is written before the data.
+        """
+        try:
+            self.dir.mkdir(parents=True, exist_ok=True)
+            for name, write in [
+                (path.name + ".size", lambda p: p.write_text(str(uncompressed_size), encoding="ascii")),
+                (path.name, lambda p: shutil.copyfile(path, p)),
+            ]:
+                tmp = self.dir / "{}.{}.tmp".format(name, os.getpid())
+                write(tmp)
+                os.replace(tmp, self.dir / name)
+        except OSError:
+            pass
+
+    @classmethod
+    def find(cls, items):
+        return next((p for p in items if isinstance(p, cls)), None)
+
+
 class ErrorInfo:
     RC_TYPE = None
     RC_TABLE = None
@@ -312,6 +638,62 @@ class ErrorInfo:
         return "Unhandled input: " + self.line
 
 
+def _prepare_resource(f, encrypt, compress):
+    f.resource_file(encrypt, compress)
+    return f._resource_file, f.uncompressed_size
+
+
+def prepare_resources(files, encrypt=None, compress=None, jobs=0, shared=None):
+    """Generates the resource files for all inputs using up to jobs processes.
+
+    If jobs is zero, a process is used for every CPU or MIN_FILES_PER_JOB
+    files, whichever is fewer. Resource IDs are assigned when parsing, so
+    the generated files do not depend on the order that jobs complete.
+    Cached files are reused, and files with identical inputs are only
+    generated once. If shared is provided, files are also reused from and
+    saved for other builds.
+    """
+    groups = {}
+    for f in files:
+        if f.RC_TYPE and not f._resource_file:
+            groups.setdefault(f.get_cache_key(encrypt, compress), []).append(f)
+    pending = []
+    for same in groups.values():
+        name = same[0].resource_name(encrypt, compress)
+        if name in RESOURCE_CACHE or (shared and shared.restore(name)):
+            for f in same:
+                f.resource_file(encrypt, compress)
+        else:
+            pending.append(same)
+    if jobs:
+        jobs = min(jobs, len(pending))
+    else:
+        jobs = min(os.cpu_count() or 1, len(pending) // MIN_FILES_PER_JOB)
+    if jobs <= 1:
+        results = [_prepare_resource(same[0], encrypt, compress) for same in pending]
+    else:
+        if encrypt:
+            # Read the key now, so that each process does not need to
+            encrypt.key
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(jobs) as pool:
+            chunksize = max(1, len(pending) // (jobs * 4))
+            results = list(pool.map(
+                _prepare_resource,
+                [same[0] for same in pending],
+                repeat(encrypt),
+                repeat(compress),
+                chunksize=chunksize,
+            ))
+    for same, (resource_file, uncompressed_size) in zip(pending, results):
+        RESOURCE_CACHE[resource_file.name] = uncompressed_size
+        if shared:
+            shared.store(resource_file, uncompressed_size)
+        for f in same:
+            f._resource_file = resource_file
+            f.uncompressed_size = uncompressed_size
+
+
 def _write_rc_string(id, s, file):
     print(id, '"', end="", file=file)
     while len(s) > 4000:
@@ -324,7 +706,7 @@ def _c_str(s):
     return '"' + str(s).replace("\\", "\\\\").replace('"', '\\"') + '"'
 
 
-def _generate_windows_files(module, files, targets, encrypt=None):
+def _generate_windows_files(module, files, targets, encrypt=None, compress=None):
     files.append(CodeFileInfo.get_builtin(IMPORTERS_RESID, targets / "dllpack_main.py", f"dllpack.{module}"))
 
     module_name = module.rpartition(".")[2]
@@ -332,9 +714,8 @@ def _generate_windows_files(module, files, targets, encrypt=None):
     with open("dllpack.rc", "w", encoding="ascii", errors="backslashescape") as rc_file:
         print("#define PYCFILE 257", file=rc_file)
         print("#define DATAFILE 258", file=rc_file)
-        for f in files:
-            if f.RC_TYPE:
-                print(f.resid, f.RC_TYPE, _c_str(f.resource_file(encrypt)), file=rc_file)
+        for f in sorted((i for i in files if i.RC_TYPE), key=lambda i: i.resid):
+            print(f.resid, f.RC_TYPE, _c_str(f.resource_file(encrypt, compress)), file=rc_file)
 
     with open("dllpack.h", "w", encoding="ascii", errors="backslashescape") as h_file:
         print('#define _MODULE_NAME "{}"'.format(module), file=h_file)
@@ -352,18 +733,20 @@ def _generate_windows_files(module, files, targets, encrypt=None):
                 continue
             expected_tables.discard(table)
             print("struct ENTRY ", table, "[] = {", sep="", file=h_file)
+            # Lookups use a binary search, so entries must be sorted by name
             for f in sorted(table_files, key=lambda i: i.name):
                 print("    {", file=h_file)
                 print('        {},'.format(_c_str(f.name)), file=h_file)
                 print('        {},'.format(_c_str(f.origin)), file=h_file)
                 print("        {},".format(f.resid), file=h_file)
-                print("        {}".format(1 if f.is_package else 0), file=h_file)
+                print("        {},".format(1 if f.is_package else 0), file=h_file)
+                print("        {}".format(getattr(f, "uncompressed_size", 0)), file=h_file)
                 print("    },", file=h_file)
             print("    {NULL, NULL, 0}", file=h_file)
             print("};", file=h_file)
-        print(f"struct ENTRY _IMPORTERS = {{NULL, NULL, {IMPORTERS_RESID}, 0}};", file=h_file)
+        print(f"struct ENTRY _IMPORTERS = {{NULL, NULL, {IMPORTERS_RESID}, 0, 0}};", file=h_file)
         for table in expected_tables:
-            print("struct ENTRY ", table, "[] = {{NULL, NULL, 0, 0}};", sep="", file=h_file)
+            print("struct ENTRY ", table, "[] = {{NULL, NULL, 0, 0, 0}};", sep="", file=h_file)
         for f in tables.get("$FUNCTIONS", ()):
             print("extern", f.prototype(), file=h_file);
         print("#define MOD_METH_TAIL \\", file=h_file)
@@ -372,28 +755,52 @@ def _generate_windows_files(module, files, targets, encrypt=None):
         print("    {NULL, NULL, 0, NULL}", file=h_file)
 
 
-def _generate_gcc_files(module, files, targets, encrypt=None):
+def _generate_gcc_files(module, files, targets, encrypt=None, compress=None):
     importer = CodeFileInfo.get_builtin(IMPORTERS_RESID, targets / "dllpack_main.py", f"dllpack.{module}")
     files.append(importer)
 
     module_name = module.rpartition(".")[2]
 
+    # Identical resources share a file, which must only be linked once.
+    # Files are linked in order of resource ID, so that a startup order
+    # applied by OrderInfo is preserved in the blob or the data section.
+    resource_files = {
+        f.resource_file(encrypt, compress): None
+        for f in sorted((i for i in files if i.RC_TYPE), key=lambda i: i.resid)
+    }
+
+    blob = BlobInfo.find(files)
+    if blob:
+        offsets = blob.write(resource_files)
+        resource_files = {Path(blob.FILE): None}
+
+        def _reference(f):
+            if not f.RC_TYPE:
+                return "_REFERENCE_BLOB(-1, 0)"
+            return "_REFERENCE_BLOB({}, {})".format(*offsets[f.resource_file()])
+    else:
+        def _reference(f):
+            if not f.RC_TYPE:
+                return "NULL"
+            return "_REFERENCE_DATA({})".format(f.resource_file().name.replace(".", "_"))
+
     with open("dllpack.rc", "w", encoding="utf-8", errors="strict") as rc_file:
-        for f in files:
-            if f.RC_TYPE:
-                print(f.resource_file(encrypt), file=rc_file)
+        for p in resource_files:
+            print(p, file=rc_file)
 
     with open("dllpack.h", "w", encoding="ascii", errors="backslashescape") as h_file:
         print('#define _MODULE_NAME "{}"'.format(module), file=h_file)
         print('#define _INIT_FUNC_NAME PyInit_{}'.format(module_name), file=h_file)
         print("#define _PYC_HEADER_LEN 16", file=h_file)
+        if blob:
+            print("#define _DLLPACK_BLOB 1", file=h_file)
         print('#include "dllpack-gcc.h"', file=h_file)
         if encrypt:
             print('#define _ENCRYPT_KEY_NAME L"{}"'.format(encrypt.name), file=h_file)
         expected_tables = {"IMPORT_TABLE", "DATA_TABLE", "REDIRECT_TABLE"}
-        for f in files:
-            if f.RC_TYPE:
-                res_name = f.resource_file(encrypt).name.replace(".", "_")
+        if not blob:
+            for p in resource_files:
+                res_name = p.name.replace(".", "_")
                 print(f"_IMPORT_DATA({res_name})", file=h_file)
         tables = groupby(files, lambda f: f.RC_TABLE)
         for table, table_files in tables.items():
@@ -401,25 +808,20 @@ def _generate_gcc_files(module, files, targets, encrypt=None):
                 continue
             expected_tables.discard(table)
             print("struct ENTRY ", table, "[] = {", sep="", file=h_file)
+            # Lookups use a binary search, so entries must be sorted by name
             for f in sorted(table_files, key=lambda i: i.name):
-                if f.RC_TYPE:
-                    res_name = "_REFERENCE_DATA({})".format(
-                        f.resource_file(encrypt).name.replace(".", "_")
-                    )
-                else:
-                    res_name = "NULL"
                 print("    {", file=h_file)
                 print("        {},".format(_c_str(f.name)), file=h_file)
                 print("        {},".format(_c_str(f.origin)), file=h_file)
-                print("        {},".format(res_name), file=h_file)
-                print("        {}".format(1 if f.is_package else 0), file=h_file)
+                print("        {},".format(_reference(f)), file=h_file)
+                print("        {},".format(1 if f.is_package else 0), file=h_file)
+                print("        {}".format(getattr(f, "uncompressed_size", 0)), file=h_file)
                 print("    },", file=h_file)
-            print("    {NULL, NULL, NULL}", file=h_file)
+            print("    {NULL}", file=h_file)
             print("};", file=h_file)
-        res_name = importer.resource_file(encrypt).name.replace(".", "_")
-        print(f"struct ENTRY _IMPORTERS = {{_MODULE_NAME, _MODULE_NAME, _REFERENCE_DATA({res_name}), 0}};", file=h_file)
+        print(f"struct ENTRY _IMPORTERS = {{_MODULE_NAME, _MODULE_NAME, {_reference(importer)}, 0, 0}};", file=h_file)
         for table in expected_tables:
-            print("struct ENTRY ", table, "[] = {{NULL, NULL, NULL, 0}};", sep="", file=h_file)
+            print("struct ENTRY ", table, "[] = {{NULL}};", sep="", file=h_file)
         for f in tables.get("$FUNCTIONS", ()):
             print("extern", f.prototype(), file=h_file);
         print("#define MOD_METH_TAIL \\", file=h_file)
@@ -440,7 +842,16 @@ if __name__ == "__main__":
     FROM_MODULE, MODULE = ModuleInfo.find(PARSED, MODULE)
     PLATFORM = PlatformInfo.find(PARSED)
     ENCRYPT = EncryptInfo.find_key(PARSED)
+    COMPRESS = CompressionInfo.find(PARSED)
+    CompressFileInfo.apply(PARSED)
+    ORDER = OrderInfo.find(PARSED)
+    if ORDER:
+        ORDER.apply(PARSED)
     TARGETS = Path(sys.argv[3]).absolute()
+    try:
+        JOBS = int(sys.argv[4])
+    except (IndexError, ValueError):
+        JOBS = 0
     GENERATOR = {
         "windows": _generate_windows_files,
         "gcc": _generate_gcc_files,
@@ -451,4 +862,7 @@ if __name__ == "__main__":
                 f.remap_namespace(FROM_MODULE, MODULE)
             except AttributeError:
                 pass
-    GENERATOR(MODULE, PARSED, TARGETS, ENCRYPT)
+    read_cache()
+    prepare_resources(PARSED, ENCRYPT, COMPRESS, JOBS, SharedInfo.find(PARSED))
+    GENERATOR(MODULE, PARSED, TARGETS, ENCRYPT, COMPRESS)
+    write_cache(PARSED)
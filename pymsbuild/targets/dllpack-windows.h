@@ -16,16 +16,27 @@ struct ENTRY {
     const char *origin;
     int id;
     char is_package;
+    // Zero if the data is not compressed
+    Py_ssize_t uncompressed_size;
 };
 
 
 static HMODULE hInstance;
 
 typedef struct {
+    // Cached by dllpack.c
+    PyObject *module_spec_type;
+    PyObject *origin_root;
+    PyObject *data_names;
+    PyObject *decompress;
+    PyObject *data_cache;
     BCRYPT_ALG_HANDLE hAlg;
     BCRYPT_KEY_HANDLE hKey;
 } ModuleState;
 
+// Implemented in dllpack.c
+static PyObject *decompress_buffer(ModuleState *ms, const struct ENTRY *entry, const char *buffer, Py_ssize_t cbBuffer);
+
 
 static void *
 decrypt_buffer(ModuleState *ms, const char **buffer, DWORD *cbBuffer)
@@ -87,9 +98,6 @@ load_bytes(ModuleState *ms, const struct ENTRY *entry)
         PyErr_Format(PyExc_ModuleNotFoundError, "unable to open '%s'", entry->origin);
         return NULL;
     }
-    if (PySys_Audit("pymsbuild.dllpack.load_bytes", "ss", _DLLPACK_NAME, entry->origin) < 0) {
-        return NULL;
-    }
     PyObject *obj;
     HRSRC block = FindResourceW(hInstance, MAKEINTRESOURCE(entry->id), MAKEINTRESOURCE(_DATAFILE));
     if (!block) {
@@ -101,6 +109,10 @@ load_bytes(ModuleState *ms, const struct ENTRY *entry)
         PyErr_SetFromWindowsErr(GetLastError());
         return NULL;
     }
+    Py_ssize_t cbRead = entry->uncompressed_size ? entry->uncompressed_size : (Py_ssize_t)cbBuffer;
+    if (PySys_Audit("pymsbuild.dllpack.load_bytes", "ssn", _DLLPACK_NAME, entry->origin, cbRead) < 0) {
+        return NULL;
+    }
     HGLOBAL res = LoadResource(hInstance, block);
     if (!res) {
         PyErr_SetFromWindowsErr(GetLastError());
@@ -120,12 +132,60 @@ load_bytes(ModuleState *ms, const struct ENTRY *entry)
             return NULL;
         }
     }
-    obj = PyBytes_FromStringAndSize(buffer, cbBuffer);
+    if (entry->uncompressed_size) {
+        obj = decompress_buffer(ms, entry, buffer, cbBuffer);
+    } else {
+        obj = PyBytes_FromStringAndSize(buffer, cbBuffer);
+    }
     FreeResource(res);
     free_decrypt_cookie(decrypt_cookie);
     return obj;
 }
 
+static PyObject *
+load_view(ModuleState *ms, const struct ENTRY *entry)
+{
+    if (encrypt_variable || entry->uncompressed_size) {
+        // Decrypted or decompressed data is always a copy
+        PyObject *b = load_bytes(ms, entry);
+        if (!b) {
+            return NULL;
+        }
+        PyObject *obj = PyMemoryView_FromObject(b);
+        Py_DECREF(b);
+        return obj;
+    }
+    if (!entry->id) {
+        PyErr_Format(PyExc_ModuleNotFoundError, "unable to open '%s'", entry->origin);
+        return NULL;
+    }
+    HRSRC block = FindResourceW(hInstance, MAKEINTRESOURCE(entry->id), MAKEINTRESOURCE(_DATAFILE));
+    if (!block) {
+        PyErr_SetFromWindowsErr(GetLastError());
+        return NULL;
+    }
+    DWORD cbBuffer = SizeofResource(hInstance, block);
+    if (!cbBuffer) {
+        PyErr_SetFromWindowsErr(GetLastError());
+        return NULL;
+    }
+    if (PySys_Audit("pymsbuild.dllpack.load_view", "ssn", _DLLPACK_NAME, entry->origin, (Py_ssize_t)cbBuffer) < 0) {
+        return NULL;
+    }
+    HGLOBAL res = LoadResource(hInstance, block);
+    if (!res) {
+        PyErr_SetFromWindowsErr(GetLastError());
+        return NULL;
+    }
+    // Resources remain mapped until the DLL is unloaded, which never happens
+    const char *buffer = (const char*)LockResource(res);
+    if (!buffer) {
+        PyErr_SetFromWindowsErr(GetLastError());
+        return NULL;
+    }
+    return PyMemoryView_FromMemory((char *)buffer, cbBuffer, PyBUF_READ);
+}
+
 static PyObject *
 load_pyc(ModuleState *ms, const struct ENTRY *entry)
 {
@@ -166,8 +226,21 @@ load_pyc(ModuleState *ms, const struct ENTRY *entry)
             return NULL;
         }
     }
-    // Our .pyc has a header
-    obj = PyMarshal_ReadObjectFromString(&buffer[_PYC_HEADER_LEN], cbBuffer - _PYC_HEADER_LEN);
+    if (entry->uncompressed_size) {
+        PyObject *data = decompress_buffer(ms, entry, buffer, cbBuffer);
+        if (data && PyBytes_GET_SIZE(data) < _PYC_HEADER_LEN) {
+            Py_CLEAR(data);
+            PyErr_Format(PyExc_ModuleNotFoundError, "unable to import '%s' %zi", entry->name, (Py_ssize_t)cbBuffer);
+        }
+        obj = data ? PyMarshal_ReadObjectFromString(
+            &PyBytes_AS_STRING(data)[_PYC_HEADER_LEN],
+            PyBytes_GET_SIZE(data) - _PYC_HEADER_LEN
+        ) : NULL;
+        Py_XDECREF(data);
+    } else {
+        // Our .pyc has a header
+        obj = PyMarshal_ReadObjectFromString(&buffer[_PYC_HEADER_LEN], cbBuffer - _PYC_HEADER_LEN);
+    }
     FreeResource(res);
     free_decrypt_cookie(decrypt_cookie);
     return obj;
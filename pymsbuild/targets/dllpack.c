@@ -40,27 +40,71 @@ entry_matches(const struct ENTRY *entry, const char *name, size_t cchName)
     return MATCH_PREFIX;
 }
 
+// Tables are sorted by name in dllpack-generate.py, and end with a NULL entry
+#define TABLE_LENGTH(table) (sizeof(table) / sizeof((table)[0]) - 1)
+
+// Compares an entry name against the first cchName characters of name
+// followed by sep. Using '\0' for sep compares the full name, and '.'
+// compares with the names of all submodules.
+static int
+compare_entry(const char *entry_name, const char *name, size_t cchName, char sep)
+{
+    int r = strncmp(entry_name, name, cchName);
+    if (r) {
+        return r;
+    }
+    return (int)(unsigned char)entry_name[cchName] - (int)(unsigned char)sep;
+}
+
+// Returns the index of the first entry that is not less than name+sep
+static size_t
+lower_bound(const struct ENTRY *table, size_t count, const char *name, size_t cchName, char sep)
+{
+    size_t lo = 0, hi = count;
+    while (lo < hi) {
+        size_t mid = lo + (hi - lo) / 2;
+        if (compare_entry(table[mid].name, name, cchName, sep) < 0) {
+            lo = mid + 1;
+        } else {
+            hi = mid;
+        }
+    }
+    return lo;
+}
+
+static const struct ENTRY *
+find_entry(const struct ENTRY *table, size_t count, const char *name, size_t cchName, char sep)
+{
+    size_t i = lower_bound(table, count, name, cchName, sep);
+    if (i < count && !compare_entry(table[i].name, name, cchName, sep)) {
+        return &table[i];
+    }
+    return NULL;
+}
+
 static const struct ENTRY *
 lookup_import(const char *name, int *is_package)
 {
-    int cchName = strlen(name);
+    size_t cchName = strlen(name);
     *is_package = 0;
     if (PySys_Audit("pymsbuild.dllpack.lookup_import", "ss", _DLLPACK_NAME, name) < 0) {
         return NULL;
     }
-    for (struct ENTRY *entry = IMPORT_TABLE; entry->name; ++entry) {
-        switch (entry_matches(entry, name, cchName)) {
-        case MATCH_FULL:
-            *is_package = 0;
-            return entry;
-        case MATCH_FULL_PACKAGE:
-            *is_package = 1;
-            return entry;
-        case MATCH_PARENT:
-        case MATCH_PREFIX:
-            *is_package = 1;
-            return NULL;
+    const struct ENTRY *entry = find_entry(IMPORT_TABLE, TABLE_LENGTH(IMPORT_TABLE), name, cchName, '\0');
+    if (entry) {
+        *is_package = entry->is_package ? 1 : 0;
+        return entry;
+    }
+    if (!cchName) {
+        for (entry = IMPORT_TABLE; entry->name; ++entry) {
+            if (entry_matches(entry, name, cchName) == MATCH_PARENT) {
+                *is_package = 1;
+                break;
+            }
         }
+    } else if (find_entry(IMPORT_TABLE, TABLE_LENGTH(IMPORT_TABLE), name, cchName, '.')) {
+        // Any submodule makes this an implicit package
+        *is_package = 1;
     }
     return NULL;
 }
@@ -71,12 +115,7 @@ lookup_data(const char *name)
     if (PySys_Audit("pymsbuild.dllpack.lookup_data", "ss", _DLLPACK_NAME, name) < 0) {
         return NULL;
     }
-    for (struct ENTRY *entry = DATA_TABLE; entry->name; ++entry) {
-        if (!strcmp(entry->name, name)) {
-            return entry;
-        }
-    }
-    return NULL;
+    return find_entry(DATA_TABLE, TABLE_LENGTH(DATA_TABLE), name, strlen(name), '\0');
 }
 
 static const struct ENTRY *
@@ -85,12 +124,77 @@ lookup_redirect(const char *name)
     if (PySys_Audit("pymsbuild.dllpack.lookup_redirect", "ss", _DLLPACK_NAME, name) < 0) {
         return NULL;
     }
-    for (struct ENTRY *entry = REDIRECT_TABLE; entry->name; ++entry) {
-        if (!strcmp(entry->name, name)) {
-            return entry;
+    return find_entry(REDIRECT_TABLE, TABLE_LENGTH(REDIRECT_TABLE), name, strlen(name), '\0');
+}
+
+
+// Decompresses data that was compressed by dllpack-generate.py. The zlib
+// module is only imported when the first compressed entry is accessed.
+static PyObject *
+decompress_buffer(ModuleState *ms, const struct ENTRY *entry, const char *buffer, Py_ssize_t cbBuffer)
+{
+    if (PySys_Audit("pymsbuild.dllpack.decompress", "ssn", _DLLPACK_NAME, entry->origin, entry->uncompressed_size) < 0) {
+        return NULL;
+    }
+    if (!ms->decompress) {
+        PyObject *zlib_m = PyImport_ImportModule("zlib");
+        if (!zlib_m) {
+            return NULL;
+        }
+        ms->decompress = PyObject_GetAttrString(zlib_m, "decompress");
+        Py_DECREF(zlib_m);
+        if (!ms->decompress) {
+            return NULL;
         }
     }
-    return NULL;
+    PyObject *src = PyMemoryView_FromMemory((char *)buffer, cbBuffer, PyBUF_READ);
+    if (!src) {
+        return NULL;
+    }
+    PyObject *r = PyObject_CallFunction(ms->decompress, "Oin", src, 15, entry->uncompressed_size);
+    Py_DECREF(src);
+    if (r && (!PyBytes_Check(r) || PyBytes_GET_SIZE(r) != entry->uncompressed_size)) {
+        Py_CLEAR(r);
+        PyErr_Format(PyExc_ImportError, "Failed to decompress '%s'", entry->origin);
+    }
+    return r;
+}
+
+// Compressed resources up to this size are kept after their first access.
+// Larger resources are decompressed into a new copy on each read, which the
+// caller owns, so that they are released when no longer referenced.
+#ifndef _DLLPACK_DATA_CACHE_LIMIT
+#define _DLLPACK_DATA_CACHE_LIMIT (1024 * 1024)
+#endif
+
+// Compressed resources are kept after their first access, so that they are
+// not decompressed again on each read. Decrypted data is never kept.
+static PyObject *
+load_cached_bytes(ModuleState *ms, const struct ENTRY *entry)
+{
+#ifdef _ENCRYPT_KEY_NAME
+    return load_bytes(ms, entry);
+#else
+    if (entry->uncompressed_size > _DLLPACK_DATA_CACHE_LIMIT) {
+        return load_bytes(ms, entry);
+    }
+    if (!ms->data_cache) {
+        ms->data_cache = PyDict_New();
+        if (!ms->data_cache) {
+            return NULL;
+        }
+    }
+    PyObject *r = PyDict_GetItemString(ms->data_cache, entry->name);
+    if (r) {
+        Py_INCREF(r);
+        return r;
+    }
+    r = load_bytes(ms, entry);
+    if (r && PyDict_SetItemString(ms->data_cache, entry->name, r) < 0) {
+        Py_CLEAR(r);
+    }
+    return r;
+#endif
 }
 
 
@@ -125,6 +229,10 @@ mod_exec_module_impl(ModuleState *ms, const char *name, PyObject *mod, int is_ma
     if (!pyc) {
         return NULL;
     }
+    if (PySys_Audit("pymsbuild.dllpack.exec_module", "sss", _DLLPACK_NAME, name, e->origin) < 0) {
+        Py_DECREF(pyc);
+        return NULL;
+    }
 
     PyObject *spec = PyObject_GetAttrString(mod, "__spec__");
     PyObject *oname = spec ? PyObject_GetAttrString(spec, "name") : NULL;
@@ -143,6 +251,9 @@ mod_exec_module_impl(ModuleState *ms, const char *name, PyObject *mod, int is_ma
         return NULL;
     }
     Py_DECREF(r);
+    if (PySys_Audit("pymsbuild.dllpack.exec_module_done", "sss", _DLLPACK_NAME, name, e->origin) < 0) {
+        return NULL;
+    }
     return mod;
 }
 
@@ -238,8 +349,9 @@ mod_makespec(PyObject *self, PyObject *args)
 {
     const char *name;
     PyObject *loader, *path_prefix;
-    PyObject *ilib_m = NULL, *mspec = NULL, *kwargs = NULL, *origin = NULL, *r = NULL;
+    PyObject *ilib_m = NULL, *kwargs = NULL, *origin = NULL, *r = NULL;
     PyObject *args2 = NULL;
+    ModuleState *ms = (ModuleState*)PyModule_GetState(self);
 
     if (!PyArg_ParseTuple(args, "sOO", &name, &loader, &path_prefix)) {
         return NULL;
@@ -249,13 +361,15 @@ mod_makespec(PyObject *self, PyObject *args)
         goto error;
     }
 
-    ilib_m = PyImport_ImportModule("importlib.machinery");
-    if (!ilib_m) {
-        goto error;
-    }
-    mspec = PyObject_GetAttrString(ilib_m, "ModuleSpec");
-    if (!mspec) {
-        goto error;
+    if (!ms->module_spec_type) {
+        ilib_m = PyImport_ImportModule("importlib.machinery");
+        if (!ilib_m) {
+            goto error;
+        }
+        ms->module_spec_type = PyObject_GetAttrString(ilib_m, "ModuleSpec");
+        if (!ms->module_spec_type) {
+            goto error;
+        }
     }
     kwargs = PyDict_New();
     if (!kwargs) {
@@ -280,26 +394,18 @@ mod_makespec(PyObject *self, PyObject *args)
             Py_SETREF(loader, Py_None);
         }
     }
-    origin = PyObject_GetAttrString(self, "_origin_root");
-    if (!origin) {
-        PyErr_Clear();
-        origin = get_origin_root();
-        if (origin) {
-            if (PySys_Audit("pymsbuild.dllpack.get_origin_root", "sO", _DLLPACK_NAME, origin) < 0) {
-                goto error;
-            }
-            if (PyObject_SetAttrString(self, "_origin_root", origin) < 0) {
-                goto error;
-            }
+    if (!ms->origin_root) {
+        PyObject *root = get_origin_root();
+        if (!root) {
+            goto error;
         }
-    }
-    if (origin) {
-        if (e) {
-            Py_SETREF(origin, PyUnicode_FromFormat("%U%s", origin, e->origin));
-        } else {
-            Py_SETREF(origin, PyUnicode_FromFormat("%U%s", origin, name));
+        if (PySys_Audit("pymsbuild.dllpack.get_origin_root", "sO", _DLLPACK_NAME, root) < 0) {
+            Py_DECREF(root);
+            goto error;
         }
+        ms->origin_root = root;
     }
+    origin = PyUnicode_FromFormat("%U%s", ms->origin_root, e ? e->origin : name);
     if (!origin) {
         goto error;
     }
@@ -316,9 +422,9 @@ mod_makespec(PyObject *self, PyObject *args)
         goto error;
     }
 
-    r = PyObject_Call(mspec, args2, kwargs);
+    r = PyObject_Call(ms->module_spec_type, args2, kwargs);
 
-    if (is_package) {
+    if (r && is_package) {
         PyObject *paths = PyList_New(0);
         if (!paths) {
             Py_CLEAR(r);
@@ -339,7 +445,6 @@ mod_makespec(PyObject *self, PyObject *args)
 error:
     Py_XDECREF(origin);
     Py_XDECREF(kwargs);
-    Py_XDECREF(mspec);
     Py_XDECREF(ilib_m);
     Py_XDECREF(args2);
 
@@ -385,7 +490,12 @@ mod_module_names(PyObject *self, PyObject *args)
     if (!r) {
         return NULL;
     }
-    for (struct ENTRY *entry = IMPORT_TABLE; entry->name; ++entry) {
+    struct ENTRY *entry = IMPORT_TABLE;
+    if (cchPrefix) {
+        // Only submodules of prefix need to be checked
+        entry = &IMPORT_TABLE[lower_bound(IMPORT_TABLE, TABLE_LENGTH(IMPORT_TABLE), prefix, cchPrefix, '.')];
+    }
+    for (; entry->name; ++entry) {
         switch (entry_matches(entry, prefix, cchPrefix)) {
         case MATCH_PARENT:
             if (_mod_module_names_append(r, entry, prefix, cchPrefix) < 0) {
@@ -393,6 +503,11 @@ mod_module_names(PyObject *self, PyObject *args)
                 return NULL;
             }
             break;
+        case MATCH_NONE:
+            if (cchPrefix) {
+                return r;
+            }
+            break;
         }
     }
     return r;
@@ -409,6 +524,9 @@ mod_data(PyObject *self, PyObject *args)
     const struct ENTRY *e = lookup_data(name);
     if (e) {
         ModuleState *ms = (ModuleState*)PyModule_GetState(self);
+        if (e->uncompressed_size) {
+            return load_cached_bytes(ms, e);
+        }
         return load_bytes(ms, e);
     }
     PyErr_Format(PyExc_FileNotFoundError, "'%s' is not part of this package", name);
@@ -417,27 +535,64 @@ mod_data(PyObject *self, PyObject *args)
 
 
 static PyObject *
-mod_data_names(PyObject *self, PyObject *args)
+mod_data_view(PyObject *self, PyObject *args)
 {
-    PyObject *r = PyList_New(0);
-    if (!r) {
+    const char *name;
+    if (!PyArg_ParseTuple(args, "s", &name)) {
+        return NULL;
+    }
+    const struct ENTRY *e = lookup_data(name);
+    if (e) {
+        ModuleState *ms = (ModuleState*)PyModule_GetState(self);
+        if (e->uncompressed_size) {
+            PyObject *b = load_cached_bytes(ms, e);
+            if (!b) {
+                return NULL;
+            }
+            PyObject *r = PyMemoryView_FromObject(b);
+            Py_DECREF(b);
+            return r;
+        }
+        return load_view(ms, e);
+    }
+    if (PyErr_Occurred()) {
         return NULL;
     }
+    PyErr_Format(PyExc_FileNotFoundError, "'%s' is not part of this package", name);
+    return NULL;
+}
+
+
+static PyObject *
+mod_data_names(PyObject *self, PyObject *args)
+{
+    ModuleState *ms = (ModuleState*)PyModule_GetState(self);
     if (PySys_Audit("pymsbuild.dllpack.data_names", "s", _DLLPACK_NAME) < 0) {
         return NULL;
     }
+    if (ms->data_names) {
+        Py_INCREF(ms->data_names);
+        return ms->data_names;
+    }
+    PyObject *r = PyFrozenSet_New(NULL);
+    if (!r) {
+        return NULL;
+    }
     for (struct ENTRY *entry = DATA_TABLE; entry->name; ++entry) {
         PyObject *o = PyUnicode_FromString(entry->name);
         if (!o) {
             Py_DECREF(r);
             return NULL;
         }
-        if (PyList_Append(r, o) < 0) {
+        if (PySet_Add(r, o) < 0) {
             Py_DECREF(r);
             Py_DECREF(o);
             return NULL;
         }
+        Py_DECREF(o);
     }
+    Py_INCREF(r);
+    ms->data_names = r;
     return r;
 }
 
@@ -461,10 +616,41 @@ mod_exec(PyObject *m)
 }
 
 
+static int
+mod_traverse(PyObject *m, visitproc visit, void *arg)
+{
+    ModuleState *ms = (ModuleState *)PyModule_GetState(m);
+    if (ms) {
+        Py_VISIT(ms->module_spec_type);
+        Py_VISIT(ms->origin_root);
+        Py_VISIT(ms->data_names);
+        Py_VISIT(ms->decompress);
+        Py_VISIT(ms->data_cache);
+    }
+    return 0;
+}
+
+
+static int
+mod_clear(PyObject *m)
+{
+    ModuleState *ms = (ModuleState *)PyModule_GetState(m);
+    if (ms) {
+        Py_CLEAR(ms->module_spec_type);
+        Py_CLEAR(ms->origin_root);
+        Py_CLEAR(ms->data_names);
+        Py_CLEAR(ms->decompress);
+        Py_CLEAR(ms->data_cache);
+    }
+    return 0;
+}
+
+
 static void
 mod_free(PyObject *m)
 {
     ModuleState *ms = (ModuleState *)PyModule_GetState(m);
+    mod_clear(m);
     if (ms)
         dllpack_free_module(ms);
 }
@@ -474,6 +660,7 @@ static struct PyMethodDef mod_meth[] = {
     {"__NAME", mod_name, METH_NOARGS, NULL},
     {"__MAKESPEC", mod_makespec, METH_VARARGS, NULL},
     {"__DATA", mod_data, METH_VARARGS, NULL},
+    {"__DATA_VIEW", mod_data_view, METH_VARARGS, NULL},
     {"__DATA_NAMES", mod_data_names, METH_NOARGS, NULL},
     {"__CREATE_MODULE", mod_create_module, METH_VARARGS, NULL},
     {"__EXEC_MODULE", mod_exec_module, METH_VARARGS, NULL},
@@ -495,8 +682,8 @@ static struct PyModuleDef modmodule = {
     sizeof(ModuleState),
     mod_meth,
     mod_slots,
-    NULL,
-    NULL,
+    mod_traverse,
+    mod_clear,
     (freefunc)mod_free
 };
 
@@ -1,4 +1,5 @@
 def _init():
+    import io
     import sys
     from importlib.machinery import ExtensionFileLoader
 
@@ -6,11 +7,54 @@ def _init():
     _NAME_DOT = _NAME + "."
     _MAKESPEC = __MAKESPEC
     _DATA = __DATA
-    _DATA_NAMES = set(__DATA_NAMES())
+    _DATA_VIEW = __DATA_VIEW
+    _DATA_NAMES = __DATA_NAMES()
     _CREATE_MODULE = __CREATE_MODULE
     _EXEC_MODULE = __EXEC_MODULE
     _MODULE_NAMES = __MODULE_NAMES
 
+    class DllPackResource(io.RawIOBase):
+        """Reads a resource directly from the loaded module."""
+        def __init__(self, view):
+            self._view = view
+            self._pos = 0
+
+        def readable(self):
+            return True
+
+        def seekable(self):
+            return True
+
+        def readinto(self, b):
+            n = max(0, min(len(b), len(self._view) - self._pos))
+            b[:n] = self._view[self._pos:self._pos + n]
+            self._pos += n
+            return n
+
+        def readall(self):
+            r = self._view[self._pos:].tobytes()
+            self._pos = len(self._view)
+            return r
+
+        def seek(self, offset, whence=io.SEEK_SET):
+            if whence == io.SEEK_CUR:
+                offset += self._pos
+            elif whence == io.SEEK_END:
+                offset += len(self._view)
+            if offset < 0:
+                raise ValueError("negative seek position " + str(offset))
+            self._pos = offset
+            return offset
+
+        def tell(self):
+            return self._pos
+
+        def getbuffer(self):
+            return self._view
+
+    DllPackResource.__name__ += "_" + _NAME
+    DllPackResource.__qualname__ = "<generated>." + DllPackResource.__name__
+
     class DllPackReader:
         class Traversable:
             def __init__(self, name, prefix):
@@ -25,6 +69,10 @@ def _init():
             def read_bytes(self):
                 return _DATA(self._prefix + self.name)
 
+            def read_view(self):
+                """Returns a read-only memoryview of the resource without copying it."""
+                return _DATA_VIEW(self._prefix + self.name)
+
             def read_text(self, encoding="utf-8", errors="strict"):
                 return self.read_bytes().decode(encoding, errors)
 
@@ -52,8 +100,7 @@ def _init():
             def open(self, mode='r', *args, **kwargs):
                 if mode not in ('r', 'rb'):
                     raise ValueError("unsupported mode: " + mode)
-                import io
-                o = io.BytesIO(self.read_bytes())
+                o = io.BufferedReader(DllPackResource(self.read_view()))
                 if mode == 'r':
                     return io.TextIOWrapper(o, *args, **kwargs)
                 return o
@@ -62,8 +109,11 @@ def _init():
             self.prefix = prefix
 
         def open_resource(self, resource):
-            import io
-            return io.BytesIO(_DATA(self.prefix + resource))
+            return io.BufferedReader(DllPackResource(_DATA_VIEW(self.prefix + resource)))
+
+        def resource_view(self, resource):
+            """Returns a read-only memoryview of the resource without copying it."""
+            return _DATA_VIEW(self.prefix + resource)
 
         def resource_path(self, resource):
             raise FileNotFoundError()
@@ -144,4 +194,4 @@ __file__ = __spec__.origin
 __loader__ = __spec__.loader
 __package__ = getattr(__spec__, "parent", None)
 __path__ = __spec__.submodule_search_locations
-del _init, __CREATE_MODULE, __DATA, __DATA_NAMES, __EXEC_MODULE, __MODULE_NAMES, __MAKESPEC, __NAME
+del _init, __CREATE_MODULE, __DATA, __DATA_VIEW, __DATA_NAMES, __EXEC_MODULE, __MODULE_NAMES, __MAKESPEC, __NAME
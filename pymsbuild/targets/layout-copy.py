@@ -0,0 +1,161 @@
+import argparse
+import base64
+import hashlib
+import os
+import shutil
+import sys
+import time
+from pathlib import Path
+
+# Digests are only recorded for files that were last modified at least this
+# long before they were hashed, so that a later change within the same
+# timestamp tick cannot be mistaken for the recorded content.
+RACY_NS = 2 * 1000 * 1000 * 1000
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--manifest", metavar="FILE", type=Path, required=False, help="Manifest of copied files to write")
+parser.add_argument("--root", metavar="DIR", type=Path, required=False, help="Directory that manifest paths are relative to")
+parser.add_argument("--reference", metavar="FILE", type=Path, required=False, help="Manifest of another layout whose digests may be reused")
+parser.add_argument("files", type=Path, help="File containing SOURCE<tab>DESTINATION lines")
+
+
+def read_files(file):
+    with open(file, "r", encoding="utf-8-sig") as f:
+        return [i.rstrip("\r\n").split("\t", 1) for i in f if i.strip()]
+
+
+def read_manifest(file, root=None):
+    # Same format as pymsbuild._build._read_manifest, but returns the root
+    # of the layout as well. Manifests for layouts other than root are empty.
+    try:
+        f = open(file, "r", encoding="utf-8-sig")
+    except OSError:
+        return None, {}
+    manifest = {}
+    with f:
+        header = f.readline().rstrip("\r\n")
+        if not header.startswith("# ") or (root and not same_path(header[2:], root)):
+            return None, {}
+        for i in f:
+            bits = i.rstrip("\r\n").rsplit("\t", 3)
+            if len(bits) == 4:
+                manifest[bits[0]] = int(bits[1]), int(bits[2]), bits[3]
+    return header[2:], manifest
+
+
+def write_manifest(file, root, manifest):
+    tmp = file.with_name(file.name + ".tmp")
+    file.parent.mkdir(parents=True, exist_ok=True)
+    with open(tmp, "w", encoding="utf-8") as f:
+        print("#", root, file=f)
+        for rn, (size, mtime, digest) in manifest.items():
+            print(rn, size, mtime, digest, sep="\t", file=f)
+    os.replace(tmp, file)
+
+
+def same_path(p1, p2):
+    return os.path.normcase(os.path.abspath(p1)) == os.path.normcase(os.path.abspath(p2))
+
+
+def same_file(p1, p2):
+    try:
+        return os.path.samefile(p1, p2)
+    except OSError:
+        return False
+
+
+def encode_digest(hasher):
+    return "sha256=" + base64.urlsafe_b64encode(hasher.digest()).rstrip(b"=").decode()
+
+
+def hash_file(path):
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for b in iter(lambda: f.read(65536), b""):
+            hasher.update(b)
+    return encode_digest(hasher)
+
+
+def copy(src, dest, st, need_hash):
+    """Copies src to dest, preferring a hard link, and returns (copied, digest).
+
+    The digest is only calculated when need_hash is true, in which case the
+    source is read exactly once. Destinations with the same size and mtime
+    as the source are left alone.
+    """
+    try:
+        dst = os.stat(dest)
+    except OSError:
+        dst = None
+    if dst and (dst.st_size, dst.st_mtime_ns) == (st.st_size, st.st_mtime_ns):
+        return False, hash_file(src) if need_hash else None
+    if dst:
+        os.unlink(dest)
+    try:
+        os.link(src, dest)
+    except OSError:
+        pass
+    else:
+        return True, hash_file(src) if need_hash else None
+    if not need_hash:
+        shutil.copy2(src, dest)
+        return True, None
+    hasher = hashlib.sha256()
+    with open(src, "rb") as f1, open(dest, "wb") as f2:
+        for b in iter(lambda: f1.read(65536), b""):
+            hasher.update(b)
+            f2.write(b)
+    # The mtime is kept, so that the manifest entry matches the destination
+    shutil.copystat(src, dest)
+    return True, encode_digest(hasher)
+
+
+def main(args):
+    if args.manifest and not args.root:
+        parser.error("--root is required with --manifest")
+    start = time.time_ns()
+    _, previous = read_manifest(args.manifest, args.root) if args.manifest else (None, {})
+    # Files linked into the reference layout from the same source, such as
+    # pure-Python modules in another tag's layout, need not be hashed again
+    ref_root, reference = read_manifest(args.reference) if args.reference else (None, {})
+    manifest = {}
+    copied = []
+    hashed = 0
+    for src, dest in read_files(args.files):
+        rn = os.path.relpath(dest, args.root) if args.root else dest
+        if rn in manifest:
+            continue
+        st = os.stat(src)
+        digest = None
+        try:
+            size, mtime, digest = previous[rn]
+        except KeyError:
+            pass
+        else:
+            if (size, mtime) != (st.st_size, st.st_mtime_ns):
+                digest = None
+        if not digest and rn in reference:
+            size, mtime, ref_digest = reference[rn]
+            if (size, mtime) == (st.st_size, st.st_mtime_ns) and same_file(src, os.path.join(ref_root, rn)):
+                digest = ref_digest
+        need_hash = bool(args.manifest) and not digest
+        was_copied, new_digest = copy(src, dest, st, need_hash)
+        if was_copied:
+            copied.append(src)
+        if need_hash:
+            hashed += 1
+            digest = new_digest if st.st_mtime_ns < start - RACY_NS else ""
+        manifest[rn] = st.st_size, st.st_mtime_ns, digest or ""
+
+    if copied:
+        print("Copied to layout:")
+        for src in copied:
+            print(" -", src)
+    if args.manifest:
+        write_manifest(args.manifest, args.root, manifest)
+        print(f"Recorded {len(manifest)} files in {args.manifest} ({hashed} hashed)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(parser.parse_args()))
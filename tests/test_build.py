@@ -56,7 +56,7 @@ def dump_layout_dir(bs):
     print(*[f"- {f.relative_to(bs.layout_dir)}" for f in bs.layout_dir.rglob("*")], sep="\n")
 
 
-@pytest.mark.parametrize("configuration", ["Debug", "Release"])
+@pytest.mark.parametrize("configuration", ["Debug", "Release", "ReleaseLTO"])
 def test_build(build_state, configuration):
     os.environ["BUILD_BUILDNUMBER"] = "1"
     bs = build_state
@@ -163,6 +163,10 @@ def test_build_wheel_layout(build_state):
     states = [p for p in files if Path(p).match("__state.txt")]
     assert not states
 
+    manifest = (bs.temp_dir / "layout_manifest.txt").read_text("utf-8").splitlines()
+    assert manifest[0] == f"# {bs.layout_dir}"
+    assert {i.partition("\t")[0].replace(os.sep, "/") for i in manifest[1:]} == files - set(records)
+
 
 @pytest.mark.parametrize("proj", ["testcython", "testproject1", "testpurepy", "testempty"])
 @pytest.mark.parametrize("configuration", ["Debug", "Release"])
@@ -178,21 +182,148 @@ def test_build_test_project(build_state, testdata, proj, configuration, target):
     getattr(bs, target)()
 
 
-@pytest.mark.parametrize("configuration", ["Debug", "Release"])
-def test_dllpack(build_state, testdata, configuration):
-    bs = build_state
-    bs.source_dir = testdata / "testdllpack"
+def _prepare_dllpack(bs, source_dir, **options):
+    bs.source_dir = source_dir
     bs.package = None
     bs.verbose = True
     bs.finalize()
+    bs.package.options.update(options)
+    return bs
+
+
+def _run_dllpack_test(bs, *args, cwd=None, env=None):
+    subprocess.check_call(
+        [sys.executable, str(bs.source_dir / "test-dllpack.py"), *args],
+        cwd=cwd,
+        env={**os.environ, "PYTHONPATH": str(bs.layout_dir), **(env or {})}
+    )
+
+
+@pytest.mark.parametrize("configuration", ["Debug", "Release"])
+def test_dllpack(build_state, testdata, configuration):
+    bs = _prepare_dllpack(build_state, testdata / "testdllpack")
     bs.generate()
     bs.configuration = configuration
     bs.build()
     dump_layout_dir(bs)
+    _run_dllpack_test(bs)
+
+
+def test_dllpack_parallel(testdata, tmp_path):
+    generated = []
+    for jobs in ["1", "2"]:
+        bs = BuildState()
+        bs.output_dir = tmp_path / jobs / "out"
+        bs.build_dir = tmp_path / jobs / "build"
+        bs.layout_dir = tmp_path / jobs / "layout"
+        bs.temp_dir = tmp_path / jobs / "temp"
+        bs._perform_layout = False
+        _prepare_dllpack(bs, testdata / "testdllpack", ParallelCompile=jobs)
+        bs.generate()
+        bs.build()
+        _run_dllpack_test(bs)
+        generated.append([(bs.temp_dir / n).read_bytes() for n in ["dllpack.h", "dllpack.rc"]])
+    # The generated sources do not depend on the number of jobs
+    assert generated[0] == generated[1]
+
+
+def test_dllpack_incremental(build_state, testdata, tmp_path):
+    import shutil
+    shutil.copytree(testdata / "testdllpack", tmp_path / "src")
+    bs = _prepare_dllpack(build_state, tmp_path / "src")
+    bs.generate()
+    bs.build()
+    before = {p.name: p.stat().st_mtime_ns for p in bs.temp_dir.glob("*.bin*")}
+    assert before
+    with open(bs.source_dir / "mod1.py", "a", encoding="utf-8") as f:
+        print("MOD1_CHANGED = True", file=f)
+    bs.build()
+    after = {p.name: p.stat().st_mtime_ns for p in bs.temp_dir.glob("*.bin*")}
+    # Only the bytecode for mod1.py (and its object file) should be replaced
+    removed = {k.partition(".")[0] for k in set(before) - set(after)}
+    added = {k.partition(".")[0] for k in set(after) - set(before)}
+    assert len(removed) == 1, removed
+    assert len(added) == 1, added
+    assert all(after[k] == v for k, v in before.items() if k in after)
+    _run_dllpack_test(bs)
+
+
+@pytest.mark.skipif(sys.platform in {"win32"}, reason="Only supported with gcc")
+def test_dllpack_packed_resources(build_state, testdata):
+    bs = _prepare_dllpack(build_state, testdata / "testdllpack", PackResources=True)
+    bs.generate()
+    bs.build()
+    dump_layout_dir(bs)
+    assert [p.name for p in bs.temp_dir.glob("*.bin.o")] == ["dllpack_blob.bin.o"]
+    _run_dllpack_test(bs)
+
+
+def test_dllpack_profile(build_state, testdata, tmp_path):
+    import json
+    bs = _prepare_dllpack(build_state, testdata / "testdllpack")
+    bs.generate()
+    bs.build()
+    subprocess.check_call(
+        [sys.executable, "-m", "pymsbuild.dllpack_profile",
+         "--trace", str(tmp_path / "trace.json"),
+         "--report", str(tmp_path / "report.txt"),
+         str(bs.source_dir / "test-dllpack.py")],
+        env={**os.environ, "PYTHONPATH": os.pathsep.join([str(bs.layout_dir), ROOT])}
+    )
+    report = (tmp_path / "report.txt").read_text(encoding="utf-8")
+    print(report)
+    modules = {l.split()[0] for l in report.splitlines()[1:] if l.startswith("testdllpack")}
+    assert {"testdllpack", "testdllpack.mod1", "testdllpack.sub.mod2"} <= modules
+    with open(tmp_path / "trace.json", "r", encoding="utf-8") as f:
+        trace = json.load(f)["traceEvents"]
+    kinds = {(e["name"], e["cat"]) for e in trace}
+    assert ("testdllpack.mod1", "lookup") in kinds
+    assert ("testdllpack.mod1", "unmarshal") in kinds
+    assert ("testdllpack.mod1", "exec") in kinds
+    assert any(e["cat"] == "resource" and e["args"]["size"] > 0 for e in trace)
+
+
+@pytest.mark.skipif(sys.platform in {"win32"}, reason="Only supported with gcc")
+def test_dllpack_startup_order(build_state, testdata, tmp_path):
+    import re
+    bs = _prepare_dllpack(build_state, testdata / "testdllpack", PackResources=True)
+    bs.generate()
+    bs.build()
     subprocess.check_call(
-        [sys.executable, str(bs.source_dir / "test-dllpack.py")],
-        env={**os.environ, "PYTHONPATH": str(bs.layout_dir)}
+        [sys.executable, "-m", "pymsbuild.dllpack_profile",
+         "--order", str(tmp_path / "order.txt"),
+         "--report", str(tmp_path / "report.txt"),
+         str(bs.source_dir / "test-dllpack.py")],
+        env={**os.environ, "PYTHONPATH": os.pathsep.join([str(bs.layout_dir), ROOT])}
     )
+    order = (tmp_path / "order.txt").read_text(encoding="utf-8").splitlines()
+    assert "testdllpack/mod1.py" in order
+    assert "testdllpack/sub/mod2.py" in order
+    # Reverse the recorded order so that it differs from the default
+    (tmp_path / "order.txt").write_text("\n".join(reversed(order)), encoding="utf-8")
+
+    bs.build(StartupOrder=tmp_path / "order.txt")
+    header = (bs.temp_dir / "dllpack.h").read_text(encoding="ascii")
+    offsets = {
+        m.group(1): (int(m.group(2)), int(m.group(3)))
+        for m in re.finditer(r'"[^"]*",\s*"([^"]*)",\s*_REFERENCE_BLOB\((\d+), (\d+)\)', header)
+    }
+    # The importer is always first, followed by the listed files in order
+    assert offsets["$dllpack.testdllpack"][0] == 0
+    listed = [offsets[o][0] for o in reversed(order) if o in offsets]
+    assert len(listed) >= 3
+    assert listed == sorted(listed)
+    assert listed[0] == offsets["$dllpack.testdllpack"][1]
+    _run_dllpack_test(bs)
+
+
+def test_dllpack_compressed(build_state, testdata):
+    bs = _prepare_dllpack(build_state, testdata / "testdllpack", Compression="zlib", CompressionMinimumSize="0")
+    bs.package.find("__init__.py").options["Compress"] = False
+    bs.generate()
+    bs.build()
+    dump_layout_dir(bs)
+    _run_dllpack_test(bs, "-z")
 
 @pytest.mark.parametrize("configuration", ["Debug", "Release"])
 @pytest.mark.parametrize("encrypt", [b"a-bytes-key-0123", "a-str-key-01234567890123"])
@@ -201,12 +332,7 @@ def test_dllpack_encrypted(build_state, testdata, configuration, encrypt):
     if not isinstance(encrypt, str):
         import base64
         encrypt = "base64:" + base64.b64encode(encrypt).decode("ascii")
-    bs = build_state
-    bs.source_dir = testdata / "testdllpack"
-    bs.package = None
-    bs.verbose = True
-    bs.finalize()
-    bs.package.options["EncryptionKeyVariable"] = "PYMSBUILD_ENCRYPT_KEY"
+    bs = _prepare_dllpack(build_state, testdata / "testdllpack", EncryptionKeyVariable="PYMSBUILD_ENCRYPT_KEY")
     bs.generate()
     bs.configuration = configuration
     os.environ["PYMSBUILD_ENCRYPT_KEY"] = encrypt
@@ -214,16 +340,8 @@ def test_dllpack_encrypted(build_state, testdata, configuration, encrypt):
     del os.environ["PYMSBUILD_ENCRYPT_KEY"]
     dump_layout_dir(bs)
     with pytest.raises(subprocess.CalledProcessError):
-        subprocess.check_call(
-            [sys.executable, str(bs.source_dir / "test-dllpack.py"), "-p"],
-            cwd=bs.layout_dir,
-            env={**os.environ, "PYTHONPATH": str(bs.layout_dir), "PYMSBUILD_ENCRYPT_KEY": ""}
-        )
-    subprocess.check_call(
-        [sys.executable, str(bs.source_dir / "test-dllpack.py"), "-p"],
-        cwd=bs.layout_dir,
-        env={**os.environ, "PYTHONPATH": str(bs.layout_dir), "PYMSBUILD_ENCRYPT_KEY": encrypt}
-    )
+        _run_dllpack_test(bs, "-p", cwd=bs.layout_dir, env={"PYMSBUILD_ENCRYPT_KEY": ""})
+    _run_dllpack_test(bs, "-p", cwd=bs.layout_dir, env={"PYMSBUILD_ENCRYPT_KEY": encrypt})
 
 
 def build_testpyproject(config, version, tmp_path, testdata):
@@ -281,3 +399,759 @@ def test_pyproject_read_merge(tmp_path, testdata):
     print(pyproj)
     assert "Version: 0.0.1" in pkgconf
     assert "version='0.0.1'" in pyproj
+
+
+@pytest.fixture
+def pack_state(tmp_path):
+    bs = BuildState()
+    bs.source_dir = tmp_path
+    bs.output_dir = tmp_path / "out"
+    bs.layout_dir = tmp_path / "layout"
+    bs.temp_dir = tmp_path / "temp"
+    bs.metadata = {"Name": "package", "Version": "1.0"}
+    bs.config = object()
+    bs.package = T.Package("package")
+    bs.finalize_metadata()
+    (bs.metadata_dir / bs.distinfo_name).mkdir(parents=True)
+    for i in range(20):
+        p = bs.layout_dir / "package" / f"file{i}.txt"
+        p.parent.mkdir(parents=True, exist_ok=True)
+        p.write_bytes(os.urandom(i * 1000) + b"x" * (i * 10000))
+    (bs.layout_dir / bs.distinfo_name).mkdir(parents=True)
+    (bs.layout_dir / bs.distinfo_name / "METADATA").write_text("Name: package\n")
+    return bs
+
+
+def _read_wheel(wheel):
+    with zipfile.ZipFile(wheel) as zf:
+        record = next(i for i in zf.infolist() if i.filename.endswith("/RECORD"))
+        content = {i.filename: zf.read(i) for i in zf.infolist()}
+    with open(wheel, "rb") as f:
+        # Everything before RECORD, which is timestamped when written
+        raw = f.read(record.header_offset)
+    return raw, content
+
+
+def test_pack_wheel_parallel(pack_state, monkeypatch):
+    bs = pack_state
+    serial = _read_wheel(bs.output_dir / bs.pack_wheel())
+    bs.pack_threads = "4"
+    parallel = _read_wheel(bs.output_dir / bs.pack_wheel())
+    assert serial == parallel
+    bs.pack_threads = "0"
+    parallel = _read_wheel(bs.output_dir / bs.pack_wheel())
+    assert serial == parallel
+    # Compressed files larger than this are written to disk by each thread
+    monkeypatch.setattr(pymsbuild._build, "_PACK_SPOOL_SIZE", 1024)
+    parallel = _read_wheel(bs.output_dir / bs.pack_wheel())
+    assert serial == parallel
+
+
+def test_pack_wheel_without_raw_writes(pack_state, monkeypatch, capsys):
+    bs = pack_state
+    bs.wheel_compression = "*/file1*.txt=stored;*/file2*.txt=1;9"
+    bs.pack_threads = "4"
+    expect = _read_wheel(bs.output_dir / bs.pack_wheel())[1]
+
+    # Only public ZipFile APIs are used when the internals may have changed
+    monkeypatch.setattr(pymsbuild._build, "_ZIP_RAW_WRITES", False)
+    monkeypatch.setattr(pymsbuild._build, "_ZIP_COMPRESS_LEVEL", False)
+    monkeypatch.setattr(pymsbuild._build, "_write_raw", None)
+    bs.incremental_pack = "1"
+    bs.verbose = True
+    capsys.readouterr()
+    wheel = bs.output_dir / bs.pack_wheel()
+    out = capsys.readouterr().out
+    assert "Packing with one thread on this version of Python" in out
+    assert "Not reusing files from" in out
+    assert "(unchanged)" not in out
+    assert _read_wheel(wheel)[1] == expect
+    with zipfile.ZipFile(wheel) as zf:
+        types = {i.filename: i.compress_type for i in zf.infolist()}
+        assert zf.testzip() is None
+    assert types["package/file12.txt"] == zipfile.ZIP_STORED
+    assert types["package/file2.txt"] == zipfile.ZIP_DEFLATED
+
+
+def test_pack_wheel_zip64_header(tmp_path):
+    import io, struct
+    from pymsbuild._build import _write_raw
+    for file_size, expect_zip64 in [(1000, False), (zipfile.ZIP64_LIMIT, True)]:
+        with zipfile.ZipFile(tmp_path / "test.zip", "w") as zf:
+            zinfo = zipfile.ZipInfo("file.bin")
+            zinfo.file_size = file_size
+            zinfo.compress_size = 3
+            zinfo.CRC = 0
+            _write_raw(zf, zinfo, io.BytesIO(b"abc").read)
+        header = (tmp_path / "test.zip").read_bytes()[:zipfile.sizeFileHeader]
+        extra_len = struct.unpack("<H", header[28:30])[0]
+        assert bool(extra_len) == expect_zip64
+
+
+def test_pack_wheel_compression(pack_state):
+    bs = pack_state
+    (bs.layout_dir / "package" / "random.bin").write_bytes(os.urandom(100000))
+    bs.wheel_compression = "auto;*/file1*.txt=stored;.dat=0"
+    (bs.layout_dir / "package" / "zeros.dat").write_bytes(bytes(100000))
+    for threads in ["1", "4"]:
+        bs.pack_threads = threads
+        with zipfile.ZipFile(bs.output_dir / bs.pack_wheel()) as zf:
+            types = {i.filename: i.compress_type for i in zf.infolist()}
+            assert zf.testzip() is None
+        assert types["package/random.bin"] == zipfile.ZIP_STORED
+        assert types["package/file2.txt"] == zipfile.ZIP_DEFLATED
+        assert types["package/file12.txt"] == zipfile.ZIP_STORED
+        assert types["package/zeros.dat"] == zipfile.ZIP_DEFLATED
+
+
+def test_build_wheel_compression(build_state, testdata):
+    bs = build_state
+    bs.package.members.append(T.File(testdata / "testdata/mod.c", WheelCompression="stored"))
+    bs.wheel_compression = "9;*.pyd=stored"
+    bs.finalize()
+    wheel = bs.output_dir / bs.build_wheel()
+    with zipfile.ZipFile(wheel) as zf:
+        types = {i.filename: i.compress_type for i in zf.infolist()}
+    assert types["package/mod.c"] == zipfile.ZIP_STORED
+    assert types["package/mod.pyd"] == zipfile.ZIP_STORED
+    assert types["package/__init__.py"] == zipfile.ZIP_DEFLATED
+
+
+def test_parse_compression_policy():
+    from pymsbuild._build import _parse_compression_policy
+    assert _parse_compression_policy("auto;.zip=stored; *.png = 0") == [
+        ("*", "auto"), ("*.zip", "stored"), ("*.png", 0)
+    ]
+    assert _parse_compression_policy({".whl": "STORE", "*": "deflate"}) == [
+        ("*.whl", "stored"), ("*", "deflate")
+    ]
+    with pytest.raises(ValueError):
+        _parse_compression_policy("10")
+
+
+def test_pack_wheel_manifest(pack_state):
+    import base64, hashlib, time
+    from pymsbuild._build import _manifest_entry
+    bs = pack_state
+    manifest = {}
+    old = time.time_ns() - 60 * 1000 * 1000 * 1000
+    for n in bs.layout_dir.rglob("*"):
+        if n.is_file():
+            os.utime(n, ns=(old, old))
+            h = base64.urlsafe_b64encode(hashlib.sha256(n.read_bytes()).digest()).rstrip(b"=")
+            manifest[str(n.relative_to(bs.layout_dir))] = _manifest_entry(n, "sha256=" + h.decode(), time.time_ns())
+    # Recorded digests are trusted while size and mtime are unchanged
+    manifest[str(Path("package/file0.txt"))] = _manifest_entry(bs.layout_dir / "package/file0.txt", "sha256=fake", time.time_ns())
+    bs._save_manifest(manifest)
+    (bs.layout_dir / "package/file1.txt").write_bytes(b"changed")
+    (bs.layout_dir / "package/extra.txt").write_bytes(b"not in manifest")
+
+    bs._manifest = None
+    for threads in ["1", "4"]:
+        bs.pack_threads = threads
+        with zipfile.ZipFile(bs.output_dir / bs.pack_wheel()) as zf:
+            names = set(zf.namelist())
+            record = dict(i.split(",", 1) for i in zf.read("package-1.0.dist-info/RECORD").decode().splitlines())
+        # Only files recorded in the manifest are packed
+        assert "package/extra.txt" not in names
+        assert record["package/file0.txt"] == "sha256=fake,0"
+        h = base64.urlsafe_b64encode(hashlib.sha256(b"changed").digest()).rstrip(b"=").decode()
+        assert record["package/file1.txt"] == f"sha256={h},7"
+        manifest = bs._get_manifest()
+        # Digests of recently modified files are not saved for the next pack
+        assert manifest[str(Path("package/file1.txt"))][2] == ""
+        assert manifest[str(Path("package/file2.txt"))][2] == record["package/file2.txt"].rpartition(",")[0]
+
+
+@pytest.mark.parametrize("incremental", [None, "1"])
+def test_pack_wheel_manifest_same_size_edit(pack_state, incremental):
+    bs = pack_state
+    bs.incremental_pack = incremental
+    n = bs.layout_dir / "package/file1.txt"
+    bs.pack_wheel()
+    # Rewrite in place within the same timestamp tick, so neither size
+    # nor mtime change
+    st = n.stat()
+    data = b"y" * st.st_size
+    n.write_bytes(data)
+    os.utime(n, ns=(st.st_atime_ns, st.st_mtime_ns))
+    with zipfile.ZipFile(bs.output_dir / bs.pack_wheel()) as zf:
+        assert zf.read("package/file1.txt") == data
+
+
+@pytest.mark.parametrize("threads", ["1", "4"])
+def test_pack_wheel_incremental(pack_state, capsys, threads):
+    bs = pack_state
+    bs.pack_threads = threads
+    bs.wheel_compression = "*/file1*.txt=stored"
+    bs.pack_wheel()
+    bs.incremental_pack = "1"
+    bs.verbose = True
+    (bs.layout_dir / "package/file2.txt").write_bytes(b"changed")
+    (bs.layout_dir / "package/file3.txt").write_bytes(os.urandom(3000) + b"x" * 30000)
+    capsys.readouterr()
+    incremental = _read_wheel(bs.output_dir / bs.pack_wheel())
+    out = capsys.readouterr().out
+    assert "package/file1.txt (unchanged)" in out
+    assert "package/file2.txt (unchanged)" not in out
+    assert "package/file3.txt (unchanged)" not in out
+    assert "package/file4.txt (unchanged)" in out
+    assert not list(bs.output_dir.glob("*.old"))
+
+    bs.incremental_pack = None
+    full = _read_wheel(bs.output_dir / bs.pack_wheel())
+    assert incremental == full
+
+
+def test_build_wheel_repack_without_reading(build_state, monkeypatch, capfd):
+    import time
+    bs = build_state
+    bs.incremental_pack = "1"
+    bs.finalize()
+    bs.build_wheel()
+    # Files modified within the last two seconds are always hashed again
+    old = time.time_ns() - 60 * 1000 * 1000 * 1000
+    for d in [bs.build_dir, bs.temp_dir]:
+        for n in d.rglob("*"):
+            os.utime(n, ns=(old, old))
+    bs.build_wheel()
+    capfd.readouterr()
+
+    hashed = []
+    def _hash_file(path, *args):
+        hashed.append(Path(path))
+        return hash_file(path, *args)
+    def _fail(path, *args, **kwargs):
+        raise AssertionError(f"{path} was compressed again")
+    hash_file = pymsbuild._build._hash_file
+    monkeypatch.setattr(pymsbuild._build, "_hash_file", _hash_file)
+    monkeypatch.setattr(pymsbuild._build, "_add_and_record", _fail)
+    monkeypatch.setattr(pymsbuild._build, "_compress_and_record", _fail)
+    bs.build_wheel()
+    out = capfd.readouterr().out
+    # Only the regenerated wheel metadata is read again
+    assert "(0 hashed)" in out
+    assert hashed
+    assert all(n.parent.name == bs.distinfo_name for n in hashed)
+
+
+def test_pack_wheel_incremental_level(pack_state, capsys):
+    bs = pack_state
+    bs.wheel_compression = "*/file1*.txt=1"
+    bs.pack_wheel()
+    bs.incremental_pack = "1"
+    bs.verbose = True
+    # Members compressed at another deflate level are not reused
+    bs.wheel_compression = "*/file1*.txt=9"
+    capsys.readouterr()
+    incremental = _read_wheel(bs.output_dir / bs.pack_wheel())
+    out = capsys.readouterr().out
+    assert "as the compression policy has changed" in out
+    assert "(unchanged)" not in out
+
+    bs.incremental_pack = None
+    full = _read_wheel(bs.output_dir / bs.pack_wheel())
+    assert incremental == full
+
+
+def test_sdist_wheel_compression(tmp_path):
+    from pymsbuild._build import _parse_compression_policy
+    metadata = {"Name": "package", "Version": "1.0", "WheelCompression": {".png": "stored"}}
+    G.generate_distinfo(metadata, tmp_path, tmp_path)
+    (tmp_path / "_msbuild.py").write_text("")
+    bs = BuildState()
+    bs.source_dir = tmp_path
+    bs.finalize_metadata()
+    assert _parse_compression_policy(bs.wheel_compression) == [("*.png", "stored")]
+
+
+def test_pack_wheel_incremental_failure(pack_state, monkeypatch):
+    bs = pack_state
+    wheel = bs.output_dir / bs.pack_wheel()
+    original = wheel.read_bytes()
+    bs.incremental_pack = "1"
+    def _fail(*args, **kwargs):
+        raise OSError("simulated failure")
+    monkeypatch.setattr(pymsbuild._build, "_copy_compressed", _fail)
+    with pytest.raises(OSError):
+        bs.pack_wheel()
+    # The previous wheel is restored when packing fails
+    assert wheel.read_bytes() == original
+    assert not list(bs.output_dir.glob("*.old"))
+
+
+@pytest.mark.parametrize("threads", ["1", "4"])
+@pytest.mark.parametrize("level", [None, "1"])
+def test_pack_sdist(pack_state, threads, level):
+    import tarfile
+    from pymsbuild import _build
+    bs = pack_state
+    bs.pack_threads = threads
+    bs.sdist_compression = level
+    (bs.layout_dir / "package/big.bin").write_bytes(os.urandom(100000) * 30)
+    # Ensure the parallel writer has to handle several blocks
+    old_block_size, _build._ParallelGzipFile.BLOCK_SIZE = _build._ParallelGzipFile.BLOCK_SIZE, 65536
+    try:
+        sdist = bs.output_dir / bs.pack_sdist()
+    finally:
+        _build._ParallelGzipFile.BLOCK_SIZE = old_block_size
+    expect = {p.relative_to(bs.layout_dir).as_posix(): p for p in bs.layout_dir.rglob("*") if p.is_file()}
+    with tarfile.open(sdist, "r:gz") as tf:
+        members = {i.name: i for i in tf.getmembers()}
+        assert set(members) == set(expect)
+        for name, p in expect.items():
+            assert tf.extractfile(members[name]).read() == p.read_bytes()
+            assert abs(members[name].mtime - p.stat().st_mtime) < 1
+
+
+@pytest.mark.parametrize("threads", ["1", "4"])
+def test_pack_sdist_failure(pack_state, monkeypatch, threads):
+    import tarfile
+    bs = pack_state
+    bs.pack_threads = threads
+    addfile = tarfile.TarFile.addfile
+    calls = []
+    def _addfile(self, *args, **kwargs):
+        calls.append(args)
+        if len(calls) > 2:
+            raise OSError("simulated failure")
+        return addfile(self, *args, **kwargs)
+    monkeypatch.setattr(tarfile.TarFile, "addfile", _addfile)
+    with pytest.raises(OSError):
+        bs.pack_sdist()
+    # The partially written sdist is removed
+    assert not (bs.output_dir / bs.sdist_name).exists()
+
+
+def test_pack_sdist_outside_layout(pack_state, tmp_path, capsys):
+    bs = pack_state
+    outside = tmp_path / "outside.txt"
+    outside.write_text("")
+    bs.pack_sdist([outside, "package/file0.txt"])
+    assert "Not including" in capsys.readouterr().out
+
+
+def test_sdist_compression_level():
+    from pymsbuild._build import _parse_gzip_level
+    assert _parse_gzip_level(None) == 9
+    assert _parse_gzip_level("0") == 0
+    with pytest.raises(ValueError):
+        _parse_gzip_level("fast")
+
+
+def test_pack_deterministic(pack_state):
+    import hashlib, tarfile
+    bs = pack_state
+    bs.deterministic = "1"
+    bs.source_date_epoch = "1700000000"
+    os.chmod(bs.layout_dir / "package/file5.txt", 0o700)
+    hashes = set()
+    for threads, mtime in [("1", 1800000000), ("4", 1900000000)]:
+        bs.pack_threads = threads
+        for p in bs.layout_dir.rglob("*"):
+            os.utime(p, (mtime, mtime))
+        wheel = bs.output_dir / bs.pack_wheel()
+        sdist = bs.output_dir / bs.pack_sdist()
+        hashes.add((
+            hashlib.sha256(wheel.read_bytes()).hexdigest(),
+            hashlib.sha256(sdist.read_bytes()).hexdigest(),
+        ))
+    assert len(hashes) == 1
+
+    with zipfile.ZipFile(wheel) as zf:
+        infos = zf.infolist()
+    names = [i.filename for i in infos]
+    assert names[:-2] == sorted(names[:-2])
+    assert names[-2:] == ["package-1.0.dist-info/METADATA", "package-1.0.dist-info/RECORD"]
+    assert {i.date_time for i in infos} == {(2023, 11, 14, 22, 13, 20)}
+    modes = {i.filename: i.external_attr >> 16 for i in infos}
+    assert modes["package/file5.txt"] == 0o100755
+    assert modes["package/file4.txt"] == 0o100644
+
+    with tarfile.open(sdist, "r:gz") as tf:
+        members = tf.getmembers()
+    assert [m.name for m in members] == sorted(m.name for m in members)
+    assert {(m.mtime, m.uid, m.gid, m.uname, m.gname) for m in members} == {(1700000000, 0, 0, "", "")}
+
+
+def test_build_cache(build_state, monkeypatch):
+    bs = build_state
+    bs.build_cache_dir = bs.temp_dir.parent / "cache"
+    bs.finalize()
+    bs.layout_wheel()
+    expect = {p.relative_to(bs.layout_dir): p.read_bytes() for p in bs.layout_dir.rglob("*") if p.is_file()}
+    wheel1 = bs.pack_wheel()
+
+    def _fail(*args, **kwargs):
+        raise AssertionError("MSBuild was invoked")
+    monkeypatch.setattr(subprocess, "check_call", _fail)
+    monkeypatch.setattr(subprocess, "check_output", _fail)
+
+    bs.layout_wheel()
+    actual = {p.relative_to(bs.layout_dir): p.read_bytes() for p in bs.layout_dir.rglob("*") if p.is_file()}
+    assert actual == expect
+    assert bs.pack_wheel() == wheel1
+
+    bs.configuration = "Debug"
+    with pytest.raises(AssertionError):
+        bs.layout_wheel()
+
+    bs.configuration = "Release"
+    monkeypatch.setenv("CFLAGS", "-DCHANGED")
+    with pytest.raises(AssertionError):
+        bs.layout_wheel()
+
+
+def test_build_cache_skips_venv(tmp_path):
+    from pymsbuild import _cache
+    (tmp_path / "mod.py").write_text("")
+    (tmp_path / "env" / "lib").mkdir(parents=True)
+    (tmp_path / "env" / "pyvenv.cfg").write_text("")
+    (tmp_path / "env" / "lib" / "site.py").write_text("")
+    inputs = _cache.read_inputs([tmp_path], [], tmp_path / "cache" / "inputs.txt")
+    assert [Path(p).name for p, _ in inputs] == ["mod.py"]
+
+
+def test_node_reuse_options():
+    from pymsbuild._build import get_node_reuse_options
+    opts = get_node_reuse_options(["/usr/bin/msbuild"])
+    assert opts.args
+    assert opts.shutdown is None
+    if sys.platform != "win32":
+        opts = get_node_reuse_options(["dotnet", "build"])
+        assert opts.args == ["-nodeReuse:true"]
+        assert opts.shutdown == ["dotnet", "build-server", "shutdown", "--msbuild"]
+
+        from pymsbuild._locate_dotnet import _get_version
+        if _get_version.cache_info().currsize:
+            misses = _get_version.cache_info().misses
+            get_node_reuse_options(["dotnet", "build"])
+            assert _get_version.cache_info().misses == misses
+
+
+def test_build_matrix(build_state, capfd):
+    import packaging.tags
+    bs = build_state
+    host = next(iter(packaging.tags.sys_tags()))
+    interp = host.interpreter
+    other = "{}{}".format(interp[:2], int(interp[2:]) + 1)
+    bs.matrix = f"{host}; {other}-{other}-{host.platform}"
+    wheels = bs.build_matrix()
+    out = capfd.readouterr().out
+    # Projects are generated once, and only the second tag's extension
+    # module is hashed, as __init__.py is linked from the same source
+    assert list((bs.temp_dir / str(host)).glob("*.proj"))
+    assert not list((bs.temp_dir / f"{other}-{other}-{host.platform}").glob("*.proj"))
+    assert "(1 hashed)" in out
+    assert wheels == [
+        f"package-1.0-{host}.whl",
+        f"package-1.0-{other}-{other}-{host.platform}.whl",
+    ]
+    for w in wheels:
+        with zipfile.ZipFile(bs.output_dir / w) as zf:
+            names = zf.namelist()
+            wheel_file = zf.read("package-1.0.dist-info/WHEEL").decode()
+        assert "package/__init__.py" in names
+        assert f"Tag: {w[12:-4]}" in wheel_file
+    assert len({p.name for p in bs.output_dir.glob("*.whl")}) == 2
+
+
+def test_build_matrix_shared(build_state, testdata, capsys):
+    import packaging.tags
+    bs = build_state
+    bs.source_dir = testdata / "testdllpack"
+    bs.package = None
+    host = next(iter(packaging.tags.sys_tags()))
+    interp = host.interpreter
+    other = "{}{}".format(interp[:2], int(interp[2:]) + 1)
+    bs.matrix = f"{host}; {other}-{other}-{host.platform}"
+    bs.build_matrix()
+    out = capsys.readouterr().out
+    # Bytecode is generated for the first tag and reused by the second
+    shared = {p.name for p in (bs.temp_dir / "dllpack-shared").glob("pyc_*.bin")}
+    assert shared
+    for tag in [host, f"{other}-{other}-{host.platform}"]:
+        temp_dir = bs.temp_dir / str(tag)
+        assert shared <= {p.name for p in temp_dir.glob("pyc_*.bin")}
+    assert "Reusing unchanged files from" in out
+
+
+def test_matrix_placeholders(build_state, monkeypatch):
+    import packaging.tags
+    bs = build_state
+    bs.finalize()
+    monkeypatch.setenv("PYTHON_INCLUDES", "{literal}/{abi}-{platform}")
+    m = bs._matrix_state(str(next(iter(packaging.tags.sys_tags()))))
+    assert m.python_includes == f"{{literal}}/{m.abi_only}-{m.platform}"
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Training needs the PGO runtime on PATH")
+@pytest.mark.parametrize("properties", [{}, {"Configuration": ""}])
+def test_build_pgo(build_state, testdata, tmp_path, capfd, properties):
+    src = tmp_path / "src"
+    src.mkdir()
+    (src / "mod.c").write_bytes((testdata / "testdata/mod.c").read_bytes())
+    (src / "_msbuild.py").write_text("")
+    (src / "train.py").write_text("from package import mod\nfor _ in range(100):\n    mod.roj(1, 2)\n")
+    bs = build_state
+    bs.source_dir = src
+    bs.package = T.Package("package", T.PydFile("mod", T.CSourceFile("mod.c")))
+    bs.configuration = "PGO"
+    bs.pgo_training = "train.py"
+    bs.target = "Build"
+    bs.build(**properties)
+    out = capfd.readouterr().out
+    assert "-fprofile-generate" in out
+    assert "-fprofile-use" in out
+    assert list((bs.temp_dir / "mod").glob("*.gcda"))
+    assert list((bs.build_dir / "package").glob("mod*"))
+
+
+def test_build_pgo_msvc(build_state, tmp_path):
+    (tmp_path / "train.py").write_text("")
+    bs = build_state
+    bs.source_dir = tmp_path
+    (tmp_path / "_msbuild.py").write_text("")
+    bs.configuration = "PGO"
+    bs.pgo_training = "train.py"
+    bs.platform = "win_amd64"
+    bs.target = "Build"
+    with pytest.raises(RuntimeError, match="only supported by the GCC toolset"):
+        bs.build()
+    assert not bs.build_dir.is_dir()
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Only applies to the POSIX toolchain")
+def test_python_flags_cached(build_state, capfd):
+    bs = build_state
+    bs.target = "Build"
+    bs.build()
+    out = capfd.readouterr().out
+    assert "to calculate compiler flags" in out
+    assert "--cflags" not in out
+    assert "Calculated CFLAGS=-I" in out
+    assert (bs.temp_dir / "python_flags.txt").is_file()
+
+    # Saved flags are reused by later builds
+    bs.python_cflags = bs.python_ldflags = None
+    bs.build()
+    out = capfd.readouterr().out
+    assert "to calculate compiler flags" not in out
+    assert "Calculated CFLAGS=-I" in out
+
+
+def test_quote_property():
+    from pymsbuild._build import _quote
+    assert _quote('/p:A=x"y') == '"/p:A=x\\"y"'
+    assert _quote("/p:A=x\\") == '"/p:A=x\\\\"'
+
+
+def test_find_sysconfig_file():
+    from pymsbuild._load_sysconfig import find_sysconfig_file
+    file = find_sysconfig_file()
+    if sys.platform == "win32":
+        assert file is None
+    else:
+        assert Path(file).name.startswith("_sysconfigdata_")
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Only applies to the POSIX toolchain")
+def test_parallel_compile(build_state, testdata, tmp_path, capfd):
+    src = tmp_path / "src"
+    src.mkdir()
+    (src / "mod.c").write_bytes((testdata / "testdata/mod.c").read_bytes())
+    (src / "_msbuild.py").write_text("")
+    for n in "abc":
+        (src / f"{n}.c").write_text(f"int func_{n}(void) {{ return 1; }}\n")
+    bs = build_state
+    bs.source_dir = src
+    bs.package = T.Package("package",
+        T.PydFile("mod", T.CSourceFile("*.c"), TargetExt=".pyd"),
+    )
+    bs.parallel_compile = "2"
+    bs.target = "Build"
+    bs.build()
+    assert (bs.build_dir / "package/mod.pyd").is_file()
+    out = capfd.readouterr().out
+    for n in ["mod", "a", "b", "c"]:
+        assert f"{n}.c -> {n}.c.o" in out
+
+    # Only modified files are recompiled
+    os.utime(src / "a.c", (0, 0))
+    (src / "b.c").touch()
+    bs.build()
+    out = capfd.readouterr().out
+    assert "b.c -> " in out
+    assert "a.c -> " not in out
+
+    (src / "a.c").write_text("int func_a(void) { return x; }\n")
+    (src / "c.c").write_text("int func_c(void) { return y; }\n")
+    with pytest.raises(SystemExit):
+        bs.build()
+    out = capfd.readouterr().out
+    assert "a.c : error PYMSBUILD001" in out
+    assert "c.c : error PYMSBUILD001" in out
+    assert "b.c -> " not in out
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Only applies to the POSIX toolchain")
+def test_parallel_compile_values(build_state, capfd):
+    bs = build_state
+    bs.target = "Build"
+    for value in ["true", " TRUE ", "false"]:
+        bs.parallel_compile = value
+        bs.build()
+        assert (bs.build_dir / "package/mod.pyd").is_file()
+    bs.parallel_compile = "four"
+    with pytest.raises(SystemExit):
+        bs.build()
+    assert "ParallelCompile must be" in capfd.readouterr().out
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Only applies to the POSIX toolchain")
+def test_header_dependencies(build_state, testdata, tmp_path, capfd):
+    src = tmp_path / "src"
+    src.mkdir()
+    (src / "mod.c").write_bytes((testdata / "testdata/mod.c").read_bytes())
+    (src / "_msbuild.py").write_text("")
+    (src / "a.h").write_text("#define VALUE 1\n")
+    (src / "a.c").write_text('#include "a.h"\nint func_a(void) { return VALUE; }\n')
+    (src / "b.c").write_text("int func_b(void) { return 1; }\n")
+    bs = build_state
+    bs.source_dir = src
+    bs.package = T.Package("package",
+        T.PydFile("mod", T.CSourceFile("*.c"), T.IncludeFile("*.h"), TargetExt=".pyd"),
+    )
+    bs.target = "Build"
+    bs.build()
+    out = capfd.readouterr().out
+    assert "a.c -> a.c.o" in out
+    assert "b.c -> b.c.o" in out
+    assert (bs.temp_dir / "mod/a.c.o.d").is_file()
+
+    bs.build()
+    out = capfd.readouterr().out
+    assert "a.c -> " not in out
+    assert "b.c -> " not in out
+
+    (src / "a.h").write_text("#define VALUE 2\n")
+    bs.build()
+    out = capfd.readouterr().out
+    assert "a.c -> a.c.o" in out
+    assert "b.c -> " not in out
+
+    # Escaped spaces and dollar signs in header names are unescaped
+    (src / "inc dir").mkdir()
+    (src / "inc dir/b$1.h").write_text("#define VALUE 1\n")
+    (src / "b.c").write_text('#include "inc dir/b$1.h"\nint func_b(void) { return VALUE; }\n')
+    bs.build()
+    out = capfd.readouterr().out
+    assert "b.c -> b.c.o" in out
+    bs.build()
+    out = capfd.readouterr().out
+    assert "b.c -> " not in out
+    (src / "inc dir/b$1.h").write_text("#define VALUE 2\n")
+    bs.build()
+    out = capfd.readouterr().out
+    assert "a.c -> " not in out
+    assert "b.c -> b.c.o" in out
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Only applies to the POSIX toolchain")
+def test_precompiled_header(build_state, testdata, tmp_path, capfd):
+    src = tmp_path / "src"
+    src.mkdir()
+    (src / "mod.c").write_bytes((testdata / "testdata/mod.c").read_bytes())
+    (src / "_msbuild.py").write_text("")
+    (src / "pch.h").write_text("#include <Python.h>\n#define VALUE 1\n")
+    (src / "a.c").write_text("int func_a(void) { return VALUE; }\n")
+    bs = build_state
+    bs.source_dir = src
+    bs.package = T.Package("package",
+        T.PydFile("mod", T.CSourceFile("*.c"), T.PrecompiledHeader("pch.h"), TargetExt=".pyd"),
+    )
+    bs.target = "Build"
+    bs.build()
+    out = capfd.readouterr().out
+    assert "pch.h -> pch/pch.h.gch" in out
+    assert "a.c -> a.c.o" in out
+    assert (bs.temp_dir / "mod/pch/pch.h.gch").is_file()
+    assert (bs.build_dir / "package/mod.pyd").is_file()
+
+    bs.build()
+    out = capfd.readouterr().out
+    assert "pch.h -> " not in out
+    assert "a.c -> " not in out
+
+    # Modifying the header rebuilds it and every source
+    (src / "pch.h").write_text("#include <Python.h>\n#define VALUE 2\n")
+    bs.build()
+    out = capfd.readouterr().out
+    assert "pch.h -> pch/pch.h.gch" in out
+    assert "a.c -> a.c.o" in out
+    assert "mod.c -> mod.c.o" in out
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Only applies to the POSIX toolchain")
+def test_compile_cache(build_state, testdata, tmp_path, capfd):
+    import shutil
+    src = tmp_path / "src"
+    src.mkdir()
+    (src / "mod.c").write_bytes((testdata / "testdata/mod.c").read_bytes())
+    (src / "_msbuild.py").write_text("")
+    for n in "ab":
+        (src / f"{n}.c").write_text(f"int func_{n}(void) {{ return 1; }}\n")
+    bs = build_state
+    bs.source_dir = src
+    bs.package = T.Package("package",
+        T.PydFile("mod", T.CSourceFile("*.c"), TargetExt=".pyd"),
+    )
+    bs.compile_cache = tmp_path / "cache"
+    bs.target = "Build"
+    bs.build()
+    assert "Compiler cache: 0 hits, 3 misses" in capfd.readouterr().out
+    assert len(list(bs.compile_cache.glob("*/*.o"))) == 3
+
+    # A fresh build directory is filled from the cache
+    shutil.rmtree(bs.build_dir)
+    shutil.rmtree(bs.temp_dir / "mod")
+    (src / "b.c").write_text("int func_b(void) { return 2; }\n")
+    bs.build()
+    assert "Compiler cache: 2 hits, 1 misses" in capfd.readouterr().out
+    assert (bs.build_dir / "package/mod.pyd").is_file()
+    assert (bs.temp_dir / "mod/a.c.o.d").is_file()
+
+    # Objects are evicted once the cache is over its size limit
+    bs.compile_cache_size = "0"
+    shutil.rmtree(bs.temp_dir / "mod")
+    bs.build()
+    assert "Compiler cache: 3 hits, 0 misses" in capfd.readouterr().out
+    assert not list(bs.compile_cache.glob("*/*.o"))
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Only applies to the POSIX toolchain")
+def test_compile_cache_key_debug(tmp_path, monkeypatch):
+    import importlib.util
+    spec = importlib.util.spec_from_file_location(
+        "cpp_compile", Path(pymsbuild.__file__).parent / "targets/cpp-compile.py"
+    )
+    cpp_compile = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(cpp_compile)
+    (tmp_path / "a.c").write_text("int func_a(void) { return 1; }\n")
+    for d in ["x", "y"]:
+        (tmp_path / d).mkdir()
+    cache = cpp_compile.ObjectCache(tmp_path / "cache", 0)
+
+    def get_keys(cmd):
+        keys = []
+        for d in ["x", "y"]:
+            monkeypatch.chdir(tmp_path / d)
+            keys.append(cache.get_key(cmd))
+        return keys
+
+    a = tmp_path / "a.c"
+    k1, k2 = get_keys(f"gcc -c {a} -o a.o")
+    assert k1 and k1 == k2
+    # Objects with debug information are only reused from the same directory
+    k1, k2 = get_keys(f"gcc -g -c {a} -o a.o")
+    assert k1 and k2 and k1 != k2
@@ -112,6 +112,20 @@ def test_package_project_reference(tmp_path):
     assert "package" == pf.get("./x:ItemGroup/x:Project[@Include='module.proj']/x:TargetDir").text
 
 
+@pytest.mark.parametrize("configuration, expect", [
+    (None, []),
+    ("Release", []),
+    ("ReleaseLTO", ["ReleaseLTO"]),
+    ("PGO", ["PGInstrument", "PGOptimize"]),
+])
+def test_pyd_configurations(tmp_path, configuration, expect):
+    p = T.PydFile("module")
+    pf = ProjectFileChecker(G.generate(p, tmp_path, tmp_path, configuration=configuration))
+    configs = pf.getall("./x:ItemGroup[@Label='ProjectConfigurations']/x:ProjectConfiguration/x:Configuration")
+    # Optimization configurations are only listed when they are built
+    assert {i.text for i in configs} == {"Debug", "Release", *expect}
+
+
 def test_pkginfo_gen_readback(tmp_path):
     with open(tmp_path / "txt.txt", "w", encoding="utf-8") as f:
         f.write("Test Data")
@@ -127,3 +141,48 @@ def test_pkginfo_gen_readback(tmp_path):
     d2 = G.readback_distinfo(di)
     d_check = {**d, "File": "Test Data"}
     assert d_check == d2
+
+
+def test_pkginfo_sdist_options(tmp_path):
+    d = {"Name": "package", "WheelCompression": {".png": "stored", "*": 9}}
+    G.generate_distinfo(d, tmp_path, tmp_path)
+    # Options for building wheels are kept out of PKG-INFO, but are still
+    # included in the sdist
+    assert G.readback_distinfo(tmp_path / "PKG-INFO") == {"Name": "package"}
+    options = G.readback_distinfo(tmp_path / G.SDIST_OPTIONS_FILE)
+    assert options == {"WheelCompression": ".png=stored;*=9"}
+    pf = ProjectFileChecker(G.generate(T.Package("package"), tmp_path, tmp_path))
+    sdist_md = pf.getall("./x:ItemGroup[@Label='Sdist metadata']/x:Sdist/x:RelativeSource")
+    assert G.SDIST_OPTIONS_FILE in {i.text for i in sdist_md}
+
+    G.generate_distinfo({"Name": "package"}, tmp_path, tmp_path)
+    assert not (tmp_path / G.SDIST_OPTIONS_FILE).is_file()
+
+
+def test_pyd_unity_generation(tmp_path):
+    src = tmp_path / "src"
+    src.mkdir()
+    for n in ["a.c", "b.c", "c.c", "d.c", "e.cpp", "f.cpp"]:
+        (src / n).write_text("")
+    p = T.PydFile("package",
+        T.CSourceFile("*.c").excluding("d.c"),
+        T.CSourceFile("*.cpp"),
+        T.CSourceFile("d.c", ExcludeFromUnityBuild=True),
+        UnityBuild=2,
+    )
+    pf = ProjectFileChecker(G._generate_c_project(p, tmp_path, src))
+
+    unity_dir = tmp_path / "package.unity"
+    clcompile = {PurePath(i).name for i in pf.getall("./x:ItemGroup/x:ClCompile", "Include")}
+    assert clcompile == {"unity0.c", "unity1.cpp", "c.c", "d.c"}
+    assert (unity_dir / "unity0.c").read_text().splitlines() == [
+        '#include "{}"'.format((src / n).as_posix()) for n in ["a.c", "b.c"]
+    ]
+    assert (unity_dir / "unity1.cpp").is_file()
+    none = {PurePath(i).name for i in pf.getall("./x:ItemGroup/x:None", "Include")}
+    assert none == {"a.c", "b.c", "e.cpp", "f.cpp"}
+
+    p.options["UnityBuild"] = False
+    pf = ProjectFileChecker(G._generate_c_project(p, tmp_path, src))
+    clcompile = {PurePath(i).name for i in pf.getall("./x:ItemGroup/x:ClCompile", "Include")}
+    assert clcompile == {"a.c", "b.c", "c.c", "d.c", "e.cpp", "f.cpp"}
@@ -153,3 +153,52 @@ except ImportError:
 
 import testdllpack.real as real
 assert real.roj(1, 2) is None
+
+#######################################
+# Check submodule listing
+#######################################
+import pkgutil
+names = {m.name: m.ispkg for m in pkgutil.iter_modules(TDP.__path__)}
+print(names)
+assert names == {"mod1": False, "sub": True}, names
+names = {m.name: m.ispkg for m in pkgutil.iter_modules(TDP.sub.__path__)}
+print(names)
+assert names == {"mod2": False}, names
+
+#######################################
+# Check zero-copy resource access
+#######################################
+reader = TDP.__loader__.get_resource_reader("testdllpack")
+v = reader.resource_view("data.txt")
+assert isinstance(v, memoryview), type(v)
+assert v.readonly
+assert bytes(v) == i_r.read_binary(TDP, "data.txt")
+with reader.open_resource("data.txt") as f:
+    assert f.read(4) == b"This"
+    f.seek(0)
+    assert f.read() == bytes(v)
+
+if sys.version_info[:2] >= (3, 11):
+    v2 = (i_r.files(TDP) / "data.txt").read_view()
+    assert v2.readonly
+    assert bytes(v2) == bytes(v)
+    with (i_r.files(TDP) / "data.txt").open("r", encoding="ascii") as f:
+        assert f.read().startswith("This is data")
+
+#######################################
+# Check compressed storage
+#######################################
+def get_decompressed():
+    return [a[1].replace("\\", "/") for e, a in audit_events if e == "pymsbuild.dllpack.decompress"]
+
+if "-z" in sys.argv:
+    decompressed = get_decompressed()
+    print(decompressed)
+    assert "testdllpack/mod1.py" in decompressed
+    assert "testdllpack/test-dllpack.py" in decompressed
+    assert "testdllpack/__init__.py" not in decompressed
+    # Resources are only decompressed once
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        assert i_r.read_text(TDP, "test-dllpack.py") == c
+    assert get_decompressed() == decompressed